@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, Optional
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.web
+
+from batch import parse_overpayments
+from calculator.calculation import cached_schedules, generate_schedule, summarize_loan, summarize_schedule
+from calculator.instrumentation import configure_logging, log_event
+from calculator.loan_data import LoanData, LoanSummary
+from calculator.loan_schedule import SCHEDULE_COLUMNS
+from calculator.overpayment import Overpayment, OverpaymentData, overpayments_to_df
+
+DEFAULT_PORT = 8888
+MAX_LOAN_AMOUNT = 1e12
+MAX_ANNUAL_RATE = 1.0
+MAX_BODY_BYTES = 1024 * 1024
+MAX_MONTHS = 1200
+MAX_OVERPAYMENTS = 1000
+MAX_SCENARIOS = 100
+
+
+class RequestError(ValueError):
+    pass
+
+
+class PoolBusy(Exception):
+    pass
+
+
+def summary_dict(summary: LoanSummary) -> dict:
+    return {**asdict(summary), 'last_month': int(summary.last_month), 'years': int(summary.years),
+            'rest_months': int(summary.rest_months)}
+
+
+def check_range(field: str, value: float, low: float, high: float):
+    # NaN fails both comparisons, and infinities are beyond any bound.
+    if not low <= value <= high:
+        raise RequestError(f'{field} must be between {low:g} and {high:g}')
+
+
+def parse_loan_data(payload: dict) -> LoanData:
+    loan = payload.get('loan_data')
+    if not isinstance(loan, dict):
+        raise RequestError('loan_data must be an object')
+    try:
+        loan_data = LoanData(loan_amount=float(loan['loan_amount']),
+                             loan_annual_rate=float(loan['loan_annual_rate']),
+                             months=int(loan['months']),
+                             rate_changes={int(month): float(rate)
+                                           for month, rate in (loan.get('rate_changes') or {}).items()})
+    except KeyError as e:
+        raise RequestError(f'loan_data.{e.args[0]} is required')
+    except (TypeError, ValueError, AttributeError, OverflowError) as e:
+        raise RequestError(f'Invalid loan_data: {e}')
+    if not 0 < loan_data.loan_amount <= MAX_LOAN_AMOUNT:
+        raise RequestError(f'loan_data.loan_amount must be positive and at most {MAX_LOAN_AMOUNT:g}')
+    check_range('loan_data.loan_annual_rate', loan_data.loan_annual_rate, 0, MAX_ANNUAL_RATE)
+    for month, rate in loan_data.rate_changes.items():
+        check_range(f'loan_data.rate_changes.{month}', rate, 0, MAX_ANNUAL_RATE)
+    if not 1 <= loan_data.months <= MAX_MONTHS:
+        raise RequestError(f'loan_data.months must be between 1 and {MAX_MONTHS}')
+    return loan_data
+
+
+def parse_overpayment_list(spec, months: int) -> list[Overpayment]:
+    if spec is not None and not isinstance(spec, list):
+        raise RequestError('overpayments must be a list')
+    if spec and len(spec) > MAX_OVERPAYMENTS:
+        raise RequestError(f'At most {MAX_OVERPAYMENTS} overpayments are accepted per set')
+    try:
+        overpayments = parse_overpayments(spec, months)
+    except KeyError as e:
+        raise RequestError(f'Invalid overpayment, missing or unknown {e.args[0]}')
+    except (TypeError, ValueError, AttributeError, OverflowError) as e:
+        raise RequestError(f'Invalid overpayment: {e}')
+    for overpayment in overpayments:
+        check_range('Overpayment value', overpayment.value, 0, MAX_LOAN_AMOUNT)
+    return overpayments
+
+
+def parse_scenario(payload: dict) -> tuple[LoanData, list[Overpayment]]:
+    loan_data = parse_loan_data(payload)
+    return loan_data, parse_overpayment_list(payload.get('overpayments'), loan_data.months)
+
+
+def parse_comparison(payload: dict) -> tuple[LoanData, list[OverpaymentData], str]:
+    loan_data = parse_loan_data(payload)
+    overpayments_set = payload.get('overpayments_set') or []
+    if not isinstance(overpayments_set, list):
+        raise RequestError('overpayments_set must be a list')
+    if len(overpayments_set) > MAX_SCENARIOS:
+        raise RequestError(f'At most {MAX_SCENARIOS} overpayment sets are accepted')
+    no_overpayment_name = str(payload.get('no_overpayment_name', 'No overpayment'))
+    names = [no_overpayment_name]
+    parsed = []
+    for item in overpayments_set:
+        if not isinstance(item, dict) or 'name' not in item:
+            raise RequestError('Every overpayment set needs a name and overpayments')
+        names.append(str(item['name']))
+        parsed.append(OverpaymentData(name=names[-1],
+                                      overpayments=parse_overpayment_list(item.get('overpayments'),
+                                                                          loan_data.months)))
+    if len(set(names)) != len(names):
+        raise RequestError('Scenario names must be unique')
+    return loan_data, parsed, no_overpayment_name
+
+
+def schedule_job(loan_data: LoanData, overpayments: list[Overpayment]) -> dict:
+    schedule = generate_schedule(loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months, '',
+                                 overpayments_to_df(overpayments), rate_changes=loan_data.rate_changes)
+    return {'schedule': {name: schedule[name].to_numpy().tolist() for name in SCHEDULE_COLUMNS},
+            'summary': summary_dict(summarize_loan(schedule))}
+
+
+def summary_job(loan_data: LoanData, overpayments: list[Overpayment]) -> dict:
+    # summarize_loan(generate_schedule(...)) without building the schedule.
+    return {'summary': summary_dict(summarize_schedule(loan_data.loan_amount, loan_data.loan_annual_rate,
+                                                       loan_data.months, overpayments, loan_data.rate_changes))}
+
+
+def compare_job(loan_data: LoanData, overpayments_set: list[OverpaymentData], no_overpayment_name: str) -> dict:
+    names = [no_overpayment_name] + [overpayment_data.name for overpayment_data in overpayments_set]
+    scenarios = [(loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months, [])]
+    scenarios += [(loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months, overpayment_data.overpayments)
+                  for overpayment_data in overpayments_set]
+    entries = cached_schedules(scenarios, rate_changes=loan_data.rate_changes, labels=names)
+    base = entries[0].summary
+    return {'scenarios': [{'name': name,
+                           'summary': summary_dict(entry.summary),
+                           'interest_saved': round(base.total_interest - entry.summary.total_interest, 2),
+                           'months_saved': int(base.last_month - entry.summary.last_month)}
+                          for name, entry in zip(names, entries)]}
+
+
+def run_job(job: Callable[..., dict], *args) -> bytes:
+    # Serialized in the worker, so the event loop only copies bytes to the socket.
+    return json.dumps(job(*args)).encode()
+
+
+class WorkerPool:
+    """
+    Runs jobs in an executor from `executor_factory`, off the event loop, and refuses new ones while `max_pending`
+    are queued or running. A pool broken by a dying worker is replaced.
+    """
+
+    def __init__(self, executor_factory: Callable[[], Executor], max_pending: int):
+        self.executor_factory = executor_factory
+        self.executor = executor_factory()
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, job: Callable[..., dict], *args) -> bytes:
+        if self.pending >= self.max_pending:
+            raise PoolBusy()
+        self.pending += 1
+        executor = self.executor
+        try:
+            return await asyncio.wrap_future(executor.submit(run_job, job, *args))
+        except BrokenExecutor:
+            # A worker died (e.g. killed for memory): the request can be retried on a fresh pool.
+            if executor is self.executor:
+                log_event(logging.WARNING, 'worker_pool_restarted')
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.executor_factory()
+            raise PoolBusy()
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class JsonHandler(tornado.web.RequestHandler):
+    def write_error(self, status_code: int, **kwargs):
+        self.finish({'error': self._reason})
+
+    def finish_error(self, status_code: int, message: str):
+        self.set_status(status_code)
+        self.finish({'error': message})
+
+
+class NotFoundHandler(JsonHandler):
+    def prepare(self):
+        raise tornado.web.HTTPError(404)
+
+
+class HealthHandler(JsonHandler):
+    def initialize(self, pool: WorkerPool):
+        self.pool = pool
+
+    def get(self):
+        self.write({'status': 'ok', 'pending': self.pool.pending, 'max_pending': self.pool.max_pending})
+
+
+class JobHandler(JsonHandler):
+    def initialize(self, pool: WorkerPool, parse: Callable[[dict], tuple], job: Callable[..., dict]):
+        self.pool = pool
+        self.parse = parse
+        self.job = job
+
+    async def post(self):
+        start = time.perf_counter()
+        try:
+            payload = json.loads(self.request.body or b'null')
+            if not isinstance(payload, dict):
+                raise RequestError('The request body must be a JSON object')
+            args = self.parse(payload)
+            body = await self.pool.run(self.job, *args)
+        except PoolBusy:
+            self.set_header('Retry-After', '1')
+            return self.finish_error(503, 'All workers are busy, retry later')
+        except (ValueError, ArithmeticError) as e:
+            # Invalid JSON, invalid fields, and loans the engine rejects (e.g. rate changes outside the term) or
+            # cannot compute within the bounds above.
+            return self.finish_error(400, str(e) or 'Invalid request')
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.write(body)
+        log_event(logging.DEBUG, 'api_request', path=self.request.path, bytes=len(body),
+                  ms=round((time.perf_counter() - start) * 1000, 3))
+
+
+def make_app(pool: WorkerPool) -> tornado.web.Application:
+    return tornado.web.Application([
+        (r'/health', HealthHandler, {'pool': pool}),
+        (r'/schedule', JobHandler, {'pool': pool, 'parse': parse_scenario, 'job': schedule_job}),
+        (r'/summary', JobHandler, {'pool': pool, 'parse': parse_scenario, 'job': summary_job}),
+        (r'/compare', JobHandler, {'pool': pool, 'parse': parse_comparison, 'job': compare_job}),
+    ], default_handler_class=NotFoundHandler)
+
+
+def exit_with_parent(parent_pid: int):
+    # Worker initializer: a server killed outright (SIGKILL, OOM) cannot shut its pool down, so workers leave on
+    # their own once they are orphaned.
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(1)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def make_pool(workers: int, max_pending: Optional[int] = None, threads: bool = False) -> WorkerPool:
+    if threads:
+        return WorkerPool(lambda: ThreadPoolExecutor(max_workers=workers), max_pending=max_pending or workers * 8)
+    # Spawned rather than forked: a forked worker inherits the listening socket and its own queue pipes, so after
+    # the server is killed it would keep the port bound and never see the end of its queue.
+    context = multiprocessing.get_context('spawn')
+    return WorkerPool(lambda: ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                  initializer=exit_with_parent, initargs=(os.getpid(),)),
+                      max_pending=max_pending or workers * 8)
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Local HTTP JSON API for schedules, summaries and comparisons.')
+    parser.add_argument('--address', default='127.0.0.1', help='address to listen on, local only by default')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--threads', action='store_true', help='use worker threads instead of processes')
+    parser.add_argument('--max-pending', type=int,
+                        help='requests queued or running before new ones get 503, 8 per worker by default')
+    parser.add_argument('--max-body-bytes', type=int, default=MAX_BODY_BYTES, help='largest accepted request body')
+    parser.add_argument('--log-level', help='calculator log level (e.g. WARNING, DEBUG), INFO by default')
+    args = parser.parse_args(argv)
+    # The server log is on by default, so the startup line and worker restarts are visible.
+    configure_logging(args.log_level) or configure_logging(logging.INFO)
+
+    pool = make_pool(args.workers, args.max_pending, args.threads)
+    server = tornado.httpserver.HTTPServer(make_app(pool), max_body_size=args.max_body_bytes)
+    server.listen(args.port, address=args.address)
+    log_event(logging.INFO, 'api_listening', url=f'http://{args.address}:{args.port}', workers=args.workers,
+              executor='threads' if args.threads else 'processes')
+    loop = tornado.ioloop.IOLoop.current()
+    with contextlib.suppress(NotImplementedError):
+        loop.asyncio_loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    try:
+        loop.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import math
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from calculator.calculation import generate_schedule_batch, summarize_batch
+from calculator.export import EXPORT_FORMATS, PARQUET, TableWriter, summary_schema, summary_table
+from calculator.instrumentation import configure_logging
+from calculator.overpayment import Overpayment, OverpaymentType
+from utils import OVERPAYMENT_TYPE, OVERPAYMENT_START, OVERPAYMENT_END, OVERPAYMENT_VALUE, OVERPAYMENT_IS_CONSTANT
+
+LOAN_ID = 'loan_id'
+LOAN_AMOUNT = 'loan_amount'
+ANNUAL_RATE = 'annual_rate'
+MONTHS = 'months'
+OVERPAYMENTS = 'overpayments'
+RATE_CHANGES = 'rate_changes'
+
+SUMMARY_SCHEMA = summary_schema(pa.field(LOAN_ID, pa.int64()))
+
+
+def read_loan_book(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    if path.endswith('.parquet'):
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def parse_overpayments(spec, months: int) -> list[Overpayment]:
+    if spec is None or (isinstance(spec, float) and math.isnan(spec)) or spec == '':
+        return []
+    items = json.loads(spec) if isinstance(spec, str) else spec
+    return [Overpayment(overpayment_type=OverpaymentType[item[OVERPAYMENT_TYPE]],
+                        start_month=int(item[OVERPAYMENT_START]),
+                        # Without an end, FULL_TERM and RANGE overpayments run to the end of the term.
+                        end_month=int(item.get(OVERPAYMENT_END) or months),
+                        value=float(item[OVERPAYMENT_VALUE]),
+                        is_constant_payment=bool(item.get(OVERPAYMENT_IS_CONSTANT, False)),
+                        loan_term=months) for item in items]
+
+
+def parse_rate_changes(spec) -> dict[int, float]:
+    """A JSON object of the month from which each new annual rate applies, e.g. {"61": 0.0758}."""
+    if spec is None or (isinstance(spec, float) and math.isnan(spec)) or spec == '':
+        return {}
+    items = json.loads(spec) if isinstance(spec, str) else spec
+    # Parquet map columns arrive as lists of (month, rate) pairs.
+    return {int(month): float(rate) for month, rate in dict(items).items()}
+
+
+def loan_rate_changes(loans: pd.DataFrame) -> Optional[list[dict[int, float]]]:
+    if RATE_CHANGES not in loans:
+        return None
+    return [parse_rate_changes(spec) for spec in loans[RATE_CHANGES]]
+
+
+def loan_scenarios(loans: pd.DataFrame) -> list[tuple[float, float, int, list[Overpayment]]]:
+    specs = loans[OVERPAYMENTS] if OVERPAYMENTS in loans else [None] * len(loans)
+    return [(float(amount), float(rate), int(months), parse_overpayments(spec, int(months)))
+            for amount, rate, months, spec in zip(loans[LOAN_AMOUNT], loans[ANNUAL_RATE], loans[MONTHS], specs)]
+
+
+def batch_summary_table(ids: np.ndarray, batch) -> pa.Table:
+    return summary_table(ids, summarize_batch(batch), SUMMARY_SCHEMA)
+
+
+def run_batch(loan_book: str,
+              schedules_path: Optional[str] = None,
+              summaries_path: Optional[str] = None,
+              chunk_size: int = 1000,
+              row_group_size: int = 100_000,
+              max_workers: Optional[int] = 1,
+              export_format: str = PARQUET) -> int:
+    schedules_writer = None
+    summaries_writer = None
+    loans_done = 0
+    try:
+        for loans in read_loan_book(loan_book, chunk_size=chunk_size):
+            ids = (loans[LOAN_ID].to_numpy(dtype=np.int64) if LOAN_ID in loans
+                   else np.arange(loans_done, loans_done + len(loans), dtype=np.int64))
+            batch = generate_schedule_batch(loan_scenarios(loans), max_workers=max_workers,
+                                            rate_changes=loan_rate_changes(loans))
+
+            if schedules_path:
+                table = batch.to_arrow(ids=ids, id_column=LOAN_ID)
+                if schedules_writer is None:
+                    schedules_writer = TableWriter(schedules_path, table.schema, export_format)
+                schedules_writer.write_table(table, row_group_size=row_group_size)
+            if summaries_path:
+                if summaries_writer is None:
+                    summaries_writer = TableWriter(summaries_path, SUMMARY_SCHEMA, export_format)
+                summaries_writer.write_table(batch_summary_table(ids, batch), row_group_size=row_group_size)
+
+            loans_done += len(loans)
+            print(f'{loans_done} loans calculated')
+    finally:
+        if schedules_writer is not None:
+            schedules_writer.close()
+        if summaries_writer is not None:
+            summaries_writer.close()
+    return loans_done
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Calculate repayment schedules for a loan book (CSV or Parquet).')
+    parser.add_argument('loan_book', help='CSV or Parquet file with loan_amount, annual_rate, months and optional '
+                                          'overpayments (JSON list) and rate_changes (JSON object) columns')
+    parser.add_argument('--schedules', help='output file for the repayment schedules')
+    parser.add_argument('--summaries', help='output file for the loan summaries')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=PARQUET,
+                        help='format of the output files: Parquet, Arrow IPC stream or CSV')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='loans calculated at once')
+    parser.add_argument('--row-group-size', type=int, default=100_000,
+                        help='maximum rows per Parquet row group (or Arrow record batch)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 uses every core')
+    parser.add_argument('--log-level', help='calculator log level (e.g. INFO, DEBUG), off by default')
+    args = parser.parse_args(argv)
+    if not args.schedules and not args.summaries:
+        parser.error('at least one of --schedules or --summaries is required')
+    configure_logging(args.log_level)
+
+    run_batch(loan_book=args.loan_book,
+              schedules_path=args.schedules,
+              summaries_path=args.summaries,
+              chunk_size=args.chunk_size,
+              row_group_size=args.row_group_size,
+              max_workers=args.workers or None,
+              export_format=args.format)
+
+
+if __name__ == '__main__':
+    main()
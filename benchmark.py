@@ -0,0 +1,319 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+
+from calculator.cache import schedule_cache
+from calculator.calculation import BATCH_KERNEL_MIN_LANES, calculate_result, generate_schedule, generate_schedule_batch
+from calculator.loan_data import LoanData
+from calculator.overpayment import Overpayment, OverpaymentData, OverpaymentType, overpayments_to_df
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_STATISTIC = 'min'
+
+LOAN_AMOUNT = 450000.0
+ANNUAL_RATE = 0.0658
+TERMS = (12, 60, 120, 240, 360)
+OVERPAYMENT_COUNTS = (0, 1, 10, 50, 200)
+SCENARIO_COUNTS = (1, 10, 100)
+OVERPAYMENT_SET_COUNTS = (1, 5, 20)
+QUICK_TERMS = (12, 360)
+QUICK_OVERPAYMENT_COUNTS = (0, 1, 200)
+QUICK_SCENARIO_COUNTS = (10,)
+QUICK_OVERPAYMENT_SET_COUNTS = (5,)
+
+
+class Benchmark:
+    def __init__(self, name: str, params: dict, run: Callable[[], object], setup: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.params = params
+        self.run = run
+        self.setup = setup
+
+    def __repr__(self):
+        return f'Benchmark(name={self.name}, params={self.params})'
+
+
+def benchmark_overpayments(count: int, months: int, is_constant_payment: bool) -> list[Overpayment]:
+    """
+    `count` overpayments of 500 PLN: none, a single FULL_TERM one (the fast path of the engine)
+    or ONE_TIME ones spread evenly over the term (the generic month loop).
+    """
+    if count == 0:
+        return []
+    if count == 1:
+        return [Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=1, end_month=months,
+                            value=500.0, is_constant_payment=is_constant_payment, loan_term=months)]
+    return [Overpayment(overpayment_type=OverpaymentType.ONE_TIME, start_month=1 + idx * months // count,
+                        value=500.0, is_constant_payment=is_constant_payment, loan_term=months)
+            for idx in range(count)]
+
+
+def benchmark_overpayments_set(count: int, months: int) -> list[OverpaymentData]:
+    return [OverpaymentData(name=f'Overpayment {idx + 1}',
+                            overpayments=benchmark_overpayments(1 + idx % 10, months, idx % 2 == 1))
+            for idx in range(count)]
+
+
+def benchmark_schedules(count: int, months: int = 360) -> dict:
+    return {data.name: generate_schedule(LOAN_AMOUNT, ANNUAL_RATE, months, data.name,
+                                         overpayments_to_df(data.overpayments))
+            for data in benchmark_overpayments_set(count, months)}
+
+
+def schedule_benchmarks(terms: tuple, overpayment_counts: tuple) -> list[Benchmark]:
+    benchmarks = []
+    for months in terms:
+        for count in overpayment_counts:
+            for is_constant_payment in (False, True):
+                if count == 0 and is_constant_payment:
+                    continue
+                df = overpayments_to_df(benchmark_overpayments(count, months, is_constant_payment))
+                name = (f'generate_schedule/term={months}/overpayments={count}/'
+                        f'{"constant" if is_constant_payment else "decreasing"}')
+                benchmarks.append(Benchmark(name=name,
+                                            params={'months': months, 'overpayments': count,
+                                                    'is_constant_payment': is_constant_payment},
+                                            run=lambda months=months, df=df: generate_schedule(
+                                                LOAN_AMOUNT, ANNUAL_RATE, months, '', df)))
+    return benchmarks
+
+
+def batch_benchmarks(scenario_counts: tuple) -> list[Benchmark]:
+    benchmarks = []
+    for count in scenario_counts:
+        scenarios = [(LOAN_AMOUNT - idx * 1000, ANNUAL_RATE, 360,
+                      benchmark_overpayments((0, 1, 10)[idx % 3], 360, idx % 2 == 1)) for idx in range(count)]
+        benchmarks.append(Benchmark(name=f'generate_schedule_batch/scenarios={count}',
+                                    params={'scenarios': count},
+                                    run=lambda scenarios=scenarios: generate_schedule_batch(scenarios)))
+    # Dashboard-sized batches: only no-overpayment and FULL_TERM scenarios, below and at the kernel threshold.
+    for count in (3, 20, BATCH_KERNEL_MIN_LANES):
+        scenarios = [(LOAN_AMOUNT - idx * 1000, ANNUAL_RATE, 360, benchmark_overpayments(idx % 2, 360, False))
+                     for idx in range(count)]
+        benchmarks.append(Benchmark(name=f'generate_schedule_batch/full_term/scenarios={count}',
+                                    params={'scenarios': count, 'overpayments': 'full_term'},
+                                    run=lambda scenarios=scenarios: generate_schedule_batch(scenarios)))
+    return benchmarks
+
+
+def calculate_result_benchmarks(overpayment_set_counts: tuple) -> list[Benchmark]:
+    benchmarks = []
+    loan_data = LoanData(loan_amount=LOAN_AMOUNT, loan_annual_rate=ANNUAL_RATE, months=360)
+    for count in overpayment_set_counts:
+        overpayments_set = benchmark_overpayments_set(count, 360)
+        run = (lambda overpayments_set=overpayments_set: calculate_result(loan_data, overpayments_set))
+        benchmarks.append(Benchmark(name=f'calculate_result/overpayment_sets={count}/cold',
+                                    params={'overpayment_sets': count, 'cache': 'cold'},
+                                    run=run,
+                                    setup=schedule_cache.clear))
+        benchmarks.append(Benchmark(name=f'calculate_result/overpayment_sets={count}/warm',
+                                    params={'overpayment_sets': count, 'cache': 'warm'},
+                                    run=run))
+    return benchmarks
+
+
+def plot_benchmarks(overpayment_set_counts: tuple) -> list[Benchmark]:
+    import logging
+    import matplotlib
+    matplotlib.use('Agg')
+    from calculator.calculation import summarize_loan
+    from dashboard import plot_generator
+    from dashboard.chart_cache import chart_cache
+    # st.pyplot outside `streamlit run` renders the figure and warns about the missing script context.
+    logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').disabled = True
+
+    benchmarks = []
+    for count in overpayment_set_counts:
+        schedules = benchmark_schedules(count)
+        summaries = {label: summarize_loan(df) for label, df in schedules.items()}
+        for plot, data in (('remaining_balance', schedules),
+                           ('total_loan_cost', summaries),
+                           ('loan_duration', summaries)):
+            run = (lambda plot_function=getattr(plot_generator, f'plot_{plot}'), data=data: plot_function(data))
+            benchmarks.append(Benchmark(name=f'plot/{plot}/schedules={count}',
+                                        params={'schedules': count, 'cache': 'cold'},
+                                        run=run,
+                                        setup=chart_cache.clear))
+            benchmarks.append(Benchmark(name=f'plot/{plot}/schedules={count}/cached',
+                                        params={'schedules': count, 'cache': 'warm'},
+                                        run=run))
+    return benchmarks
+
+
+def collect_benchmarks(quick: bool = False, with_plots: bool = True) -> list[Benchmark]:
+    benchmarks = (schedule_benchmarks(QUICK_TERMS if quick else TERMS,
+                                      QUICK_OVERPAYMENT_COUNTS if quick else OVERPAYMENT_COUNTS)
+                  + batch_benchmarks(QUICK_SCENARIO_COUNTS if quick else SCENARIO_COUNTS)
+                  + calculate_result_benchmarks(QUICK_OVERPAYMENT_SET_COUNTS if quick else OVERPAYMENT_SET_COUNTS))
+    if with_plots:
+        benchmarks += plot_benchmarks(QUICK_OVERPAYMENT_SET_COUNTS if quick else OVERPAYMENT_SET_COUNTS)
+    return benchmarks
+
+
+def measure(benchmark: Benchmark, repeat: int = 5, min_time: float = 0.05) -> dict:
+    """
+    Seconds per call: every one of `repeat` samples runs the benchmark in a loop of at least `min_time`
+    seconds, with the loop size calibrated once up front. Like timeit, the garbage collector is off while timing.
+    """
+    def sample(loops: int) -> float:
+        elapsed = 0.0
+        for _ in range(loops):
+            if benchmark.setup is not None:
+                benchmark.setup()
+            start = time.perf_counter()
+            benchmark.run()
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    gc.collect()
+    is_gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        loops = 1
+        elapsed = sample(loops)
+        while elapsed < min_time:
+            loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)) + 1)
+            elapsed = sample(loops)
+        times = [sample(loops) / loops for _ in range(repeat)]
+    finally:
+        if is_gc_enabled:
+            gc.enable()
+    return {'params': benchmark.params,
+            'loops': loops,
+            'repeat': repeat,
+            'median': statistics.median(times),
+            'min': min(times),
+            'max': max(times)}
+
+
+def run_benchmarks(benchmarks: list[Benchmark],
+                   name_filter: Optional[str] = None,
+                   repeat: int = 5,
+                   min_time: float = 0.05) -> dict:
+    results = {}
+    for benchmark in benchmarks:
+        if name_filter and name_filter not in benchmark.name:
+            continue
+        results[benchmark.name] = measure(benchmark, repeat=repeat, min_time=min_time)
+        print(f'{benchmark.name}: {results[benchmark.name]["median"] * 1000:.3f} ms')
+    return {'meta': {'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                     'python': platform.python_version(),
+                     'numpy': np.__version__,
+                     'platform': platform.platform(),
+                     'machine': platform.machine(),
+                     'repeat': repeat,
+                     'min_time': min_time},
+            'results': results}
+
+
+def threshold_for(name: str, default: float, thresholds: dict[str, float]) -> float:
+    # The longest matching name prefix wins, e.g. {'plot/': 0.5} relaxes every plot benchmark.
+    matches = [prefix for prefix in thresholds if name.startswith(prefix)]
+    return thresholds[max(matches, key=len)] if matches else default
+
+
+def compare(report: dict,
+            baseline: dict,
+            threshold: float = DEFAULT_THRESHOLD,
+            thresholds: Optional[dict[str, float]] = None,
+            statistic: str = DEFAULT_STATISTIC) -> list[dict]:
+    """
+    One entry per benchmark present in both reports: the change of `statistic` (min or median seconds per call)
+    relative to the baseline and whether it exceeds the allowed threshold (0.25 = 25% slower).
+    The minimum is the least sensitive to other load on the machine.
+    """
+    thresholds = {**baseline.get('thresholds', {}), **(thresholds or {})}
+    comparison = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+        base = baseline['results'][name][statistic]
+        limit = threshold_for(name, threshold, thresholds)
+        change = result[statistic] / base - 1 if base > 0 else 0.0
+        comparison.append({'name': name,
+                           'baseline': base,
+                           statistic: result[statistic],
+                           'change': change,
+                           'threshold': limit,
+                           'is_regression': change > limit})
+    return comparison
+
+
+def load_report(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_report(report: dict, path: str):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def parse_thresholds(items: list[str]) -> dict[str, float]:
+    thresholds = {}
+    for item in items:
+        prefix, _, value = item.rpartition('=')
+        if not prefix:
+            raise argparse.ArgumentTypeError(f'Expected PREFIX=FRACTION, got {item}')
+        thresholds[prefix] = float(value)
+    return thresholds
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the schedule engine and the dashboard pipeline '
+                                                 'and compare the timings with a stored baseline.')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown, as a fraction of the baseline')
+    parser.add_argument('--threshold-for', action='append', default=[], metavar='PREFIX=FRACTION',
+                        help='allowed slowdown for benchmarks whose name starts with PREFIX')
+    parser.add_argument('--statistic', choices=('min', 'median'), default=DEFAULT_STATISTIC,
+                        help='timing compared with the baseline')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--quick', action='store_true', help='run a reduced matrix')
+    parser.add_argument('--no-plots', action='store_true', help='skip the chart rendering benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='timing samples per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per timing sample')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(collect_benchmarks(quick=args.quick, with_plots=not args.no_plots),
+                            name_filter=args.filter,
+                            repeat=args.repeat,
+                            min_time=args.min_time)
+    if args.output:
+        save_report(report, args.output)
+    if args.update_baseline:
+        baseline = load_report(args.baseline) if os.path.exists(args.baseline) else {}
+        report['thresholds'] = baseline.get('thresholds', {})
+        save_report(report, args.baseline)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, nothing to compare')
+        return 0
+
+    comparison = compare(report, load_report(args.baseline), args.threshold, parse_thresholds(args.threshold_for),
+                         args.statistic)
+    regressions = [entry for entry in comparison if entry['is_regression']]
+    for entry in comparison:
+        flag = 'REGRESSION' if entry['is_regression'] else 'ok'
+        print(f'{entry["name"]}: {entry["change"]:+.1%} (limit {entry["threshold"]:+.0%}) {flag}')
+    print(f'{len(regressions)} of {len(comparison)} benchmarks regressed')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
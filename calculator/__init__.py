@@ -0,0 +1,8 @@
+from .calculation import Result, calculate_result, cached_schedules, generate_schedule, generate_schedule_batch, \
+    iter_schedule, summarize_loan, summarize_schedule
+from .loan_data import LoanData, LoanSummary
+from .overpayment import Overpayment, OverpaymentData, OverpaymentType
+
+__all__ = ['Result', 'calculate_result', 'cached_schedules', 'generate_schedule', 'generate_schedule_batch',
+           'iter_schedule', 'summarize_loan', 'summarize_schedule',
+           'LoanData', 'LoanSummary', 'Overpayment', 'OverpaymentData', 'OverpaymentType']
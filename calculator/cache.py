@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from typing import Optional, Sequence
+
+from cachetools import TTLCache
+
+from .loan_data import LoanSummary
+from .loan_schedule import ScheduleColumns
+from .overpayment import Overpayment, OverpaymentEvents
+from .schedule_engine import CheckpointedSchedule
+
+
+class CachedSchedule:
+    def __init__(self, schedule: ScheduleColumns, summary: LoanSummary, run: Optional[CheckpointedSchedule] = None):
+        self.schedule = schedule
+        self.summary = summary
+        self.run = run
+
+
+class ScheduleCache:
+    def __init__(self, maxsize: int = 512, ttl: float = 3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key: str):
+        with self._lock:
+            return key in self._cache
+
+    def get(self, key: str) -> Optional[CachedSchedule]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CachedSchedule):
+        with self._lock:
+            self._cache[key] = entry
+
+    def resumable(self, principal: float,
+                  annual_rate: float,
+                  months: int,
+                  events: OverpaymentEvents) -> Optional[CheckpointedSchedule]:
+        # The cached run that lets `events` skip the most months, if any.
+        with self._lock:
+            runs = [entry.run for entry in self._cache.values() if entry.run is not None]
+        best, best_month = None, 1
+        for run in runs:
+            month = run.resume_month(principal, annual_rate, months, events)
+            if month > best_month:
+                best, best_month = run, month
+        return best
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'maxsize': self._cache.maxsize,
+                'ttl': self._cache.ttl
+            }
+
+
+def normalize_overpayments(overpayments: Sequence[Overpayment]) -> tuple:
+    # Order is kept on purpose: overpayments active in the same month are applied in list order.
+    return tuple(overpayment.canonical() for overpayment in overpayments)
+
+
+def schedule_key(principal: float,
+                 annual_rate: float,
+                 months: int,
+                 overpayments: list[Overpayment],
+                 rate_changes: Optional[dict[int, float]] = None) -> str:
+    canonical = (float(principal), float(annual_rate), int(months), normalize_overpayments(overpayments))
+    if rate_changes:
+        canonical += (tuple(sorted((int(month), float(rate)) for month, rate in rate_changes.items())),)
+    return hashlib.sha256(repr(canonical).encode()).hexdigest()
+
+
+schedule_cache = ScheduleCache()
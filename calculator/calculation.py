@@ -1,16 +1,26 @@
-import numpy_financial as npf
-import pandas as pd
-from pandas import DataFrame
+import logging
+from concurrent.futures import Executor
+from typing import Iterator, Mapping, Optional, TYPE_CHECKING, Union
 
-from dashboard import app_state
-from .loan_data import LoanSummary
-from .loan_schedule import ScheduleUnit
-from .overpayment import OverpaymentType, Overpayment, OverpaymentData, overpayments_to_df
-from utils import OVERPAYMENT_IS_CONSTANT, OVERPAYMENT_VALUE, OVERPAYMENT_START, OVERPAYMENT_END, round_math, \
-    OVERPAYMENT_TYPE
+import numpy as np
 
-state = app_state
-_ = app_state.translation
+from .cache import CachedSchedule, ScheduleCache, schedule_cache, schedule_key
+from .instrumentation import log_event, span
+from .loan_data import LoanData, LoanSummary, rate_path
+from .loan_schedule import ScheduleBatch, ScheduleColumns, ScheduleUnit
+from .overpayment import Overpayment, OverpaymentData, OverpaymentEvents, compile_overpayments, compile_overpayments_df
+from .parallel import resolve_workers, run_chunked
+from .schedule_engine import CheckpointedSchedule, amortize, amortize_batch, iter_amortize, iter_events, \
+    schedule_overpayments, schedule_with_checkpoints
+from utils import round_math
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Below this many no-overpayment and FULL_TERM scenarios the scalar engine is faster than the NumPy lane kernel,
+# whose per-month array rounding costs about as much as 60 scalar 360-month schedules.
+BATCH_KERNEL_MIN_LANES = 64
 
 
 class Result:
@@ -23,127 +33,257 @@ def generate_schedule(principal: float,
                       annual_rate: float,
                       months: int,
                       overpayment_name: str,
-                      overpayments: DataFrame) -> pd.DataFrame:
-    print(f'Start schedule calculation for {overpayment_name}...') if overpayment_name else print(
-        'Start schedule calculation...')
-    r = annual_rate / 12
-    saldo = round_math(principal, 2)
-    remaining_term = months
-    schedule = []
-    monthly_overpayment_value = 0.0
-    range_monthly_overpayment_value = {}
-    remaining_balance = round_math(principal, 2)
-    const_payment = round_math(npf.pmt(r, months, -saldo), 2)
-    const_saldo = round_math(principal, 2)
-
-    for m in range(1, remaining_term + 1):
-        payment = round_math(npf.pmt(r, months, -saldo), 2)
-        interest = round_math((remaining_balance * r), 2)
-        capital = round_math((payment - interest), 2)
-        schedule_unit = ScheduleUnit(month=m,
-                                     payment=payment,
-                                     interest=interest,
-                                     capital=capital,
-                                     overpayment=0.0,
-                                     remaining_balance=round_math((remaining_balance - capital), 2),
-                                     remaining_term=remaining_term)
-
-        if remaining_balance <= capital:
-            payment = interest + remaining_balance
-            schedule_unit = ScheduleUnit(month=m,
-                                         payment=payment,
-                                         interest=interest,
-                                         capital=remaining_balance,
-                                         overpayment=0.0,
-                                         remaining_balance=0.0,
-                                         remaining_term=remaining_term)
-
-        elif remaining_balance <= (capital + monthly_overpayment_value):
-            overpayment = round_math((remaining_balance - capital), 2)
-            schedule_unit = ScheduleUnit(month=m,
-                                         payment=payment,
-                                         interest=interest,
-                                         capital=remaining_balance,
-                                         overpayment=overpayment,
-                                         remaining_balance=0.0,
-                                         remaining_term=remaining_term)
-
-        elif not overpayments.empty:
-            for idx, row in overpayments.iterrows():
-                overpayment_type = row[OVERPAYMENT_TYPE]
-                start = row[OVERPAYMENT_START]
-                end = row[OVERPAYMENT_END]
-                overpayment = row[OVERPAYMENT_VALUE]
-                is_constant = row[OVERPAYMENT_IS_CONSTANT]
-
-                if start <= m <= end:
-                    if remaining_balance <= (overpayment + monthly_overpayment_value + capital):
-                        full_overpayment = round_math((remaining_balance - capital), 2)
-                        total_capital = round_math((capital + full_overpayment), 2)
-                        remaining_balance = round_math((remaining_balance - total_capital), 2)
-                        schedule_unit.overpayment = full_overpayment
-                        schedule_unit.remaining_balance = remaining_balance  # should be 0.0
-                        break
-
-                    full_overpayment = round_math((overpayment + monthly_overpayment_value), 2)
-                    saldo -= round_math(full_overpayment, 2)
-                    if is_constant:
-                        if overpayment_type == OverpaymentType.ONE_TIME.name:
-                            new_payment = round_math(npf.pmt(r, months, -saldo), 2)
-                            delta = const_payment - new_payment
-                            const_payment = new_payment
-                            new_monthly_overpayment = Overpayment(overpayment_type=OverpaymentType.RANGE,
-                                                                  start_month=start + 1,
-                                                                  end_month=months,
-                                                                  value=delta,
-                                                                  is_constant_payment=True)
-                            new_monthly_overpayment_df = pd.DataFrame([new_monthly_overpayment.convert_to_dict()])
-                            overpayments = pd.concat([overpayments, new_monthly_overpayment_df], ignore_index=True)
-
-                        elif overpayment_type == OverpaymentType.RANGE.name and end == m:
-                            new_payment = round_math(npf.pmt(r, months, -saldo), 2)
-                            delta = const_payment - new_payment
-                            const_payment = new_payment
-                            monthly_overpayment_value = range_monthly_overpayment_value[idx]
-                            new_monthly_overpayment = Overpayment(overpayment_type=OverpaymentType.RANGE,
-                                                                  start_month=end + 1,
-                                                                  end_month=months,
-                                                                  value=delta,
-                                                                  is_constant_payment=True)
-                            new_monthly_overpayment_df = pd.DataFrame([new_monthly_overpayment.convert_to_dict()])
-                            overpayments = pd.concat([overpayments, new_monthly_overpayment_df], ignore_index=True)
-                        else:
-                            if overpayment_type == OverpaymentType.RANGE.name and start == m:
-                                range_monthly_overpayment_value[idx] = monthly_overpayment_value
-                            new_payment = round_math(npf.pmt(r, months, -saldo), 2)
-                            delta = const_payment - new_payment
-                            monthly_overpayment_value = round_math(delta, 2)
-
-                    else:
-                        const_saldo -= round_math(overpayment, 2)
-                        new_payment = round_math(npf.pmt(r, months, -const_saldo), 2)
-                        const_payment = new_payment
-
-                    total_capital = round_math((capital + full_overpayment), 2)
-                    remaining_balance -= total_capital
-                    schedule_unit.update_overpayment_remaining_balance(add_overpayment=full_overpayment,
-                                                                       remaining_balance=remaining_balance)
-        if m > months:
-            print(f'Overpayment in month {m} was ignored because the loan term ended.')
-            break
-
-        schedule.append(schedule_unit)
-        remaining_term -= 1
-        remaining_balance = schedule_unit.remaining_balance
-
-        if remaining_balance <= 0:
-            print(f'The loan has been fully repaid.')
-            return pd.DataFrame([vars(item) for item in schedule])
-
-    return pd.DataFrame([vars(item) for item in schedule])
-
-
-def summarize_loan(df: DataFrame) -> LoanSummary:
+                      overpayments: 'pd.DataFrame',
+                      rate_changes: Optional[dict[int, float]] = None,
+                      cents: bool = False) -> 'pd.DataFrame':
+    log_event(logging.INFO, 'schedule_start', scenario=overpayment_name, months=months)
+    with span('engine', scenario=overpayment_name or None, months=months):
+        schedule = _schedule(principal, annual_rate, months, compile_overpayments_df(overpayments),
+                             rate_path(annual_rate, months, rate_changes), cents)
+
+    if len(schedule) and schedule.remaining_balance[len(schedule) - 1] <= 0:
+        log_event(logging.DEBUG, 'schedule_repaid', scenario=overpayment_name, last_month=len(schedule))
+    return schedule.to_df()
+
+
+def iter_schedule(principal: float,
+                  annual_rate: float,
+                  months: int,
+                  overpayments: list[Overpayment],
+                  chunk_size: Optional[int] = None,
+                  rate_changes: Optional[dict[int, float]] = None,
+                  cents: bool = False) -> Iterator[Union[ScheduleUnit, ScheduleColumns]]:
+    """
+    Lazy generate_schedule: yields one ScheduleUnit per month, or ScheduleColumns of up to chunk_size months.
+    Months are only computed when requested, so breaking out of the loop stops the calculation.
+    """
+    rows = _iter_rows(principal, annual_rate, months, compile_overpayments(overpayments),
+                      rate_path(annual_rate, months, rate_changes), cents)
+    if chunk_size is None:
+        for row in rows:
+            yield ScheduleUnit.from_row(row)
+        return
+
+    chunk = ScheduleColumns(capacity=chunk_size)
+    for row in rows:
+        chunk.append(*row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = ScheduleColumns(capacity=chunk_size)
+    if len(chunk):
+        yield chunk
+
+
+def _schedule(principal: float,
+              annual_rate: float,
+              months: int,
+              events: OverpaymentEvents,
+              rates: Optional[list[float]] = None,
+              cents: bool = False) -> ScheduleColumns:
+    full_term = events.only_full_term()
+    if not events:
+        return amortize(principal=principal, annual_rate=annual_rate, months=months, rates=rates, cents=cents)
+    if full_term is not None:
+        return amortize(principal=principal,
+                        annual_rate=annual_rate,
+                        months=months,
+                        value=full_term.value,
+                        start=full_term.start,
+                        end=full_term.end,
+                        is_constant_payment=full_term.is_constant,
+                        rates=rates,
+                        cents=cents)
+    return schedule_overpayments(principal=principal, annual_rate=annual_rate, months=months, events=events,
+                                 rates=rates, cents=cents)
+
+
+def _iter_rows(principal: float,
+               annual_rate: float,
+               months: int,
+               events: OverpaymentEvents,
+               rates: Optional[list[float]] = None,
+               cents: bool = False) -> Iterator[tuple]:
+    full_term = events.only_full_term()
+    if not events:
+        return iter_amortize(principal=principal, annual_rate=annual_rate, months=months, rates=rates, cents=cents)
+    if full_term is not None:
+        return iter_amortize(principal=principal,
+                             annual_rate=annual_rate,
+                             months=months,
+                             value=full_term.value,
+                             start=full_term.start,
+                             end=full_term.end,
+                             is_constant_payment=full_term.is_constant,
+                             rates=rates,
+                             cents=cents)
+    return iter_events(principal=principal, annual_rate=annual_rate, months=months, events=events, rates=rates,
+                       cents=cents)
+
+
+def generate_schedule_batch(scenarios: list[tuple[float, float, int, list[Overpayment]]],
+                            max_workers: Optional[int] = 1,
+                            chunk_size: Optional[int] = None,
+                            executor: Optional[Executor] = None,
+                            rate_changes: Optional[list[Optional[Mapping[int, float]]]] = None) -> ScheduleBatch:
+    """`rate_changes` holds the rate changes of each scenario (empty or None for a fixed rate)."""
+    if rate_changes is not None and any(rate_changes):
+        return _generate_schedule_batch_with_rate_changes(scenarios, rate_changes, max_workers, chunk_size, executor)
+    if executor is None and resolve_workers(max_workers) == 1:
+        return _generate_schedule_batch(scenarios)
+    return ScheduleBatch.concat(run_chunked(_generate_schedule_batch, scenarios,
+                                            max_workers=max_workers,
+                                            chunk_size=chunk_size,
+                                            executor=executor))
+
+
+def _generate_schedule_batch_with_rate_changes(scenarios: list[tuple[float, float, int, list[Overpayment]]],
+                                               rate_changes: list[Optional[Mapping[int, float]]],
+                                               max_workers: Optional[int],
+                                               chunk_size: Optional[int],
+                                               executor: Optional[Executor]) -> ScheduleBatch:
+    fixed = [idx for idx, changes in enumerate(rate_changes) if not changes]
+    fixed_batch = generate_schedule_batch([scenarios[idx] for idx in fixed], max_workers=max_workers,
+                                          chunk_size=chunk_size, executor=executor)
+    batch = ScheduleBatch(size=len(scenarios),
+                          capacity=max((int(months) for _principal, _rate, months, _overpayments in scenarios),
+                                       default=0))
+    for row, idx in enumerate(fixed):
+        batch.set_schedule(idx, fixed_batch.schedule(row))
+    # Checkpoints and the batch kernel assume a fixed rate, so each of these is computed on its own.
+    for idx, changes in enumerate(rate_changes):
+        if changes:
+            principal, annual_rate, months, overpayments = scenarios[idx]
+            batch.set_schedule(idx, _schedule(principal, annual_rate, months, compile_overpayments(overpayments),
+                                              rate_path(annual_rate, months, changes)))
+    return batch
+
+
+def _generate_schedule_batch(scenarios: list[tuple[float, float, int, list[Overpayment]]]) -> ScheduleBatch:
+    events = [compile_overpayments(overpayments) for _principal, _rate, _months, overpayments in scenarios]
+    batch = ScheduleBatch(size=len(scenarios),
+                          capacity=max((int(months) for _principal, _rate, months, _overpayments in scenarios),
+                                       default=0))
+    kernel_rows = []
+    kernel_params = []
+    for idx, ((principal, annual_rate, months, _overpayments), scenario_events) in enumerate(zip(scenarios, events)):
+        full_term = scenario_events.only_full_term()
+        if not scenario_events:
+            kernel_rows.append(idx)
+            kernel_params.append((principal, annual_rate, months, 0.0, 1, 0, False))
+        elif full_term is not None:
+            kernel_rows.append(idx)
+            kernel_params.append((principal, annual_rate, months, full_term.value, full_term.start, full_term.end,
+                                  full_term.is_constant))
+        else:
+            batch.set_schedule(idx, schedule_overpayments(principal=principal,
+                                                          annual_rate=annual_rate,
+                                                          months=months,
+                                                          events=scenario_events))
+
+    if len(kernel_rows) < BATCH_KERNEL_MIN_LANES:
+        for idx, params in zip(kernel_rows, kernel_params):
+            batch.set_schedule(idx, amortize(*params))
+    else:
+        principal, annual_rate, months, value, start, end, is_constant_payment = zip(*kernel_params)
+        amortize_batch(principal=np.array(principal),
+                       annual_rate=np.array(annual_rate),
+                       months=np.array(months),
+                       value=np.array(value),
+                       start=np.array(start),
+                       end=np.array(end),
+                       is_constant_payment=np.array(is_constant_payment),
+                       batch=batch,
+                       rows=np.array(kernel_rows))
+    return batch
+
+
+def cached_schedules(scenarios: list[tuple[float, float, int, list[Overpayment]]],
+                     cache: ScheduleCache = schedule_cache,
+                     max_workers: Optional[int] = 1,
+                     executor: Optional[Executor] = None,
+                     rate_changes: Optional[dict[int, float]] = None,
+                     labels: Optional[list[str]] = None) -> list[CachedSchedule]:
+    """`labels` name the scenarios in the timing spans (see calculator.instrumentation)."""
+    keys = [schedule_key(*scenario, rate_changes=rate_changes) for scenario in scenarios]
+    names = {}
+    entries = {}
+    missing = {}
+    for idx, (key, scenario) in enumerate(zip(keys, scenarios)):
+        if key in entries or key in missing:
+            continue
+        names[key] = labels[idx] if labels else str(idx)
+        entry = cache.get(key)
+        if entry is None:
+            missing[key] = scenario
+        else:
+            entries[key] = entry
+    log_event(logging.DEBUG, 'schedule_cache', scenarios=len(keys), hits=len(entries), misses=len(missing))
+
+    def summarized(key: str, schedule: ScheduleColumns,
+                   run: Optional[CheckpointedSchedule] = None) -> CachedSchedule:
+        with span('summary', scenario=names[key]):
+            return CachedSchedule(schedule=schedule, summary=summarize_columns(schedule), run=run)
+
+    if rate_changes:
+        # Checkpoints and the batch kernel assume a fixed rate, so each schedule is computed on its own.
+        for key, (principal, annual_rate, months, overpayments) in missing.items():
+            with span('engine', scenario=names[key], path='rate_changes'):
+                schedule = _schedule(principal, annual_rate, months, compile_overpayments(overpayments),
+                                     rate_path(annual_rate, months, rate_changes))
+            entries[key] = summarized(key, schedule)
+            cache.put(key, entries[key])
+        return [entries[key] for key in keys]
+
+    is_parallel = executor is not None or resolve_workers(max_workers) > 1
+    batched = {}
+    generic = {}
+    for key, (principal, annual_rate, months, overpayments) in missing.items():
+        events = compile_overpayments(overpayments)
+        if not events or events.only_full_term() is not None:
+            batched[key] = (principal, annual_rate, months, overpayments)
+            continue
+        # Generic overpayment sets are usually edits of a cached set, so resume from its checkpoints.
+        previous = cache.resumable(principal, annual_rate, months, events)
+        if previous is None and is_parallel:
+            generic[key] = (principal, annual_rate, months, overpayments)
+            continue
+        with span('engine', scenario=names[key], path='checkpoints', resumed=previous is not None):
+            run = schedule_with_checkpoints(principal=principal,
+                                            annual_rate=annual_rate,
+                                            months=months,
+                                            overpayments=overpayments,
+                                            previous=previous)
+        entries[key] = summarized(key, run.schedule, run)
+        cache.put(key, entries[key])
+
+    if generic:
+        # Nothing to resume from, so the full runs go to the workers like the batched scenarios.
+        with span('engine', scenario=', '.join(names[key] for key in generic), path='checkpoints'):
+            runs = [run for chunk in run_chunked(_checkpoint_runs, list(generic.values()),
+                                                 max_workers=max_workers, executor=executor)
+                    for run in chunk]
+        for key, run in zip(generic, runs):
+            entries[key] = summarized(key, run.schedule, run)
+            cache.put(key, entries[key])
+
+    if batched:
+        # The kernel runs these scenarios together, so they share one engine span.
+        with span('engine', scenario=', '.join(names[key] for key in batched), path='batch'):
+            batch = generate_schedule_batch(list(batched.values()), max_workers=max_workers, executor=executor)
+        for idx, key in enumerate(batched):
+            entries[key] = summarized(key, batch.schedule(idx).copy())
+            cache.put(key, entries[key])
+
+    return [entries[key] for key in keys]
+
+
+def _checkpoint_runs(scenarios: list[tuple[float, float, int, list[Overpayment]]]) -> list[CheckpointedSchedule]:
+    return [schedule_with_checkpoints(principal=principal, annual_rate=annual_rate, months=months,
+                                      overpayments=overpayments)
+            for principal, annual_rate, months, overpayments in scenarios]
+
+
+def summarize_loan(df: 'pd.DataFrame') -> LoanSummary:
     loan_amount = df['capital'][0] + df['overpayment'][0] + df['remaining_balance'][0]
     total_interest = df['interest'].sum()
     total_cost = loan_amount + total_interest
@@ -155,35 +295,93 @@ def summarize_loan(df: DataFrame) -> LoanSummary:
                        last_month=round_math(last_month, 2))
 
 
-def calculate_result() -> Result:
-    custom_overpayments = state.custom_overpayments_set
-    if state.is_custom_overpayment and custom_overpayments:
-        print(f'Custom_overpayments = {custom_overpayments}')
-        for overpayment_data in custom_overpayments:
-            state.overpayments_set.append(overpayment_data)
+def summarize_columns(schedule: ScheduleColumns) -> LoanSummary:
+    size = len(schedule)
+    loan_amount = schedule.capital[0] + schedule.overpayment[0] + schedule.remaining_balance[0]
+    total_interest = schedule.interest[:size].sum()
+    total_cost = loan_amount + total_interest
+    return LoanSummary(loan_amount=round_math(loan_amount, 2),
+                       total_interest=round_math(total_interest, 2),
+                       total_loan_cost=round_math(total_cost, 2),
+                       last_month=round_math(int(schedule.month[size - 1]), 2))
+
+
+def summarize_batch(batch: ScheduleBatch) -> list[LoanSummary]:
+    return [summarize_columns(batch.schedule(idx)) for idx in range(len(batch))]
+
+
+class ScheduleTotals:
+    """Running totals of a schedule consumed row by row."""
+
+    def __init__(self):
+        self.loan_amount = 0.0
+        self.total_interest = 0.0
+        self.last_month = 0
+        self.peak_outlay = 0.0
+
+    def add(self, row: tuple):
+        month, _payment, interest, capital, overpayment, payment_overpayment, remaining_balance, _term = row
+        if not self.last_month:
+            self.loan_amount = capital + overpayment + remaining_balance
+        self.total_interest += interest
+        self.last_month = month
+        if payment_overpayment > self.peak_outlay:
+            self.peak_outlay = payment_overpayment
+
+    def summary(self) -> LoanSummary:
+        total_cost = self.loan_amount + self.total_interest
+        return LoanSummary(loan_amount=round_math(self.loan_amount, 2),
+                           total_interest=round_math(self.total_interest, 2),
+                           total_loan_cost=round_math(total_cost, 2),
+                           last_month=round_math(self.last_month, 2))
+
+
+def schedule_totals(principal: float,
+                    annual_rate: float,
+                    months: int,
+                    overpayments: list[Overpayment],
+                    rate_changes: Optional[dict[int, float]] = None,
+                    cents: bool = False) -> ScheduleTotals:
+    totals = ScheduleTotals()
+    for row in _iter_rows(principal, annual_rate, months, compile_overpayments(overpayments),
+                          rate_path(annual_rate, months, rate_changes), cents):
+        totals.add(row)
+    return totals
+
+
+def summarize_schedule(principal: float,
+                       annual_rate: float,
+                       months: int,
+                       overpayments: list[Overpayment],
+                       rate_changes: Optional[dict[int, float]] = None,
+                       cents: bool = False) -> LoanSummary:
+    """
+    summarize_loan(generate_schedule(...)) without building the schedule: the rows are consumed as the
+    engine produces them and only the running totals are kept.
+    """
+    return schedule_totals(principal, annual_rate, months, overpayments, rate_changes, cents).summary()
+
+
+def calculate_result(loan_data: LoanData,
+                     overpayments_set: list[OverpaymentData],
+                     no_overpayment_name: str = 'No overpayment',
+                     max_workers: Optional[int] = 1,
+                     executor: Optional[Executor] = None) -> Result:
+    names = [no_overpayment_name]
+    scenarios = [(loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months, [])]
+    for overpayment in overpayments_set:
+        names.append(overpayment.name)
+        scenarios.append((loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months,
+                          overpayment.overpayments))
+    log_event(logging.INFO, 'calculate_result', loan_data=str(loan_data), scenarios=names)
 
+    entries = cached_schedules(scenarios, max_workers=max_workers, executor=executor,
+                               rate_changes=loan_data.rate_changes, labels=names)
     schedules = {}
     summarises = {}
-    no_overpayment_schedule = generate_schedule(principal=state.loan_data.loan_amount,
-                                                annual_rate=state.loan_data.loan_annual_rate,
-                                                months=state.loan_data.months,
-                                                overpayment_name=_('No overpayment'),
-                                                overpayments=pd.DataFrame())
-    no_overpayment_summary = summarize_loan(no_overpayment_schedule)
-    schedules[_('No overpayment')] = no_overpayment_schedule
-    summarises[_('No overpayment')] = no_overpayment_summary
-
-    if state.is_custom_overpayment or state.is_analysis_constant_overpayment:
-        overpayments: list[OverpaymentData] = state.overpayments_set
-        for overpayment in overpayments:
-            name = overpayment.name
-            print(f'Overpayment name {name}')
-            schedule = generate_schedule(principal=state.loan_data.loan_amount,
-                                         annual_rate=state.loan_data.loan_annual_rate,
-                                         months=state.loan_data.months,
-                                         overpayment_name=name,
-                                         overpayments=overpayments_to_df(overpayments=overpayment.overpayments))
-            summarises[name] = summarize_loan(schedule)
-            schedules[name] = schedule
+    for name, entry in zip(names, entries):
+        summarises[name] = entry.summary
+        with span('frame', scenario=name):
+            schedules[name] = entry.schedule.to_df()
 
     return Result(schedules=schedules, summarises=summarises)
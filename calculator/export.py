@@ -0,0 +1,153 @@
+import io
+import json
+import zipfile
+from typing import Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from .loan_data import LoanSummary
+from .loan_schedule import SCHEDULE_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from .calculation import Result
+
+PARQUET = 'parquet'
+ARROW = 'arrow'
+CSV = 'csv'
+EXPORT_FORMATS = [PARQUET, ARROW, CSV]
+
+SCENARIO = 'scenario'
+SUMMARIES_METADATA_KEY = b'summaries'
+SCHEDULES_CSV = 'schedules.csv'
+SUMMARIES_CSV = 'summaries.csv'
+
+SCHEDULE_SCHEMA = pa.schema([
+    (SCENARIO, pa.dictionary(pa.int32(), pa.string())),
+    ('month', pa.int64()),
+    ('payment', pa.float64()),
+    ('interest', pa.float64()),
+    ('capital', pa.float64()),
+    ('overpayment', pa.float64()),
+    ('payment_overpayment', pa.float64()),
+    ('remaining_balance', pa.float64()),
+    ('remaining_term', pa.int64())
+])
+
+
+def summary_schema(key: pa.Field) -> pa.Schema:
+    return pa.schema([
+        key,
+        ('loan_amount', pa.float64()),
+        ('total_interest', pa.float64()),
+        ('total_loan_cost', pa.float64()),
+        ('last_month', pa.int64()),
+        ('years', pa.int64()),
+        ('rest_months', pa.int64())
+    ])
+
+
+SCENARIO_SUMMARY_SCHEMA = summary_schema(pa.field(SCENARIO, pa.string()))
+
+
+def summary_table(keys: Sequence, summaries: Sequence[LoanSummary], schema: pa.Schema) -> pa.Table:
+    """Summaries as a table of `schema` (see summary_schema), keyed by `keys` in its first column."""
+    return pa.table({
+        schema.names[0]: keys,
+        'loan_amount': [summary.loan_amount for summary in summaries],
+        'total_interest': [summary.total_interest for summary in summaries],
+        'total_loan_cost': [summary.total_loan_cost for summary in summaries],
+        'last_month': [int(summary.last_month) for summary in summaries],
+        'years': [int(summary.years) for summary in summaries],
+        'rest_months': [int(summary.rest_months) for summary in summaries]
+    }, schema=schema)
+
+
+def schedules_table(schedules: dict[str, 'pd.DataFrame']) -> pa.Table:
+    """
+    All schedules in one table with a dictionary-encoded scenario column. Each schedule becomes one chunk that
+    wraps its NumPy columns, so the months are not copied row by row (nor at all for contiguous columns).
+    """
+    names = pa.array(list(schedules), pa.string())
+    tables = []
+    for idx, schedule in enumerate(schedules.values()):
+        scenario = pa.DictionaryArray.from_arrays(np.full(len(schedule), idx, dtype=np.int32), names)
+        columns = [scenario] + [pa.array(schedule[name].to_numpy()) for name in SCHEDULE_COLUMNS]
+        tables.append(pa.Table.from_arrays(columns, schema=SCHEDULE_SCHEMA))
+    if not tables:
+        return SCHEDULE_SCHEMA.empty_table()
+    return pa.concat_tables(tables)
+
+
+class TableWriter:
+    """Streams tables of one schema into a Parquet file, an Arrow IPC stream or a CSV file."""
+
+    def __init__(self, sink, schema: pa.Schema, export_format: str = PARQUET):
+        self.export_format = export_format
+        if export_format == PARQUET:
+            self._writer = pq.ParquetWriter(sink, schema)
+        elif export_format == ARROW:
+            self._writer = pa.ipc.new_stream(sink, schema)
+        elif export_format == CSV:
+            self._writer = pa_csv.CSVWriter(sink, schema)
+        else:
+            raise ValueError(f'Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}')
+
+    def __enter__(self) -> 'TableWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_table(self, table: pa.Table, row_group_size: Optional[int] = None):
+        if self.export_format == PARQUET:
+            self._writer.write_table(table, row_group_size=row_group_size)
+        else:
+            self._writer.write_table(table, max_chunksize=row_group_size)
+
+    def close(self):
+        self._writer.close()
+
+
+def export_result(result: 'Result', export_format: str = PARQUET) -> bytes:
+    """
+    Every schedule and summary of `result` in one file: Parquet or an Arrow IPC stream with the summaries in
+    the schema metadata, or a zip of schedules.csv and summaries.csv. read_export reads it back.
+    """
+    schedules = schedules_table(result.schedules)
+    summaries = summary_table(list(result.summarises), list(result.summarises.values()), SCENARIO_SUMMARY_SCHEMA)
+    sink = io.BytesIO()
+    if export_format == CSV:
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, table in ((SCHEDULES_CSV, schedules), (SUMMARIES_CSV, summaries)):
+                with archive.open(name, 'w') as member, TableWriter(member, table.schema, CSV) as writer:
+                    writer.write_table(table)
+        return sink.getvalue()
+
+    metadata = {SUMMARIES_METADATA_KEY: json.dumps(summaries.to_pylist()).encode()}
+    schedules = schedules.replace_schema_metadata(metadata)
+    with TableWriter(sink, schedules.schema, export_format) as writer:
+        writer.write_table(schedules)
+    return sink.getvalue()
+
+
+def read_export(data: bytes, export_format: str = PARQUET) -> tuple['pd.DataFrame', 'pd.DataFrame']:
+    """The schedules and summaries written by export_result."""
+    import pandas as pd
+    if export_format == CSV:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            with archive.open(SCHEDULES_CSV) as schedules, archive.open(SUMMARIES_CSV) as summaries:
+                return (pd.read_csv(schedules, float_precision='round_trip'),
+                        pd.read_csv(summaries, float_precision='round_trip'))
+    if export_format == PARQUET:
+        table = pq.read_table(io.BytesIO(data))
+    elif export_format == ARROW:
+        table = pa.ipc.open_stream(data).read_all()
+    else:
+        raise ValueError(f'Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}')
+    summaries = json.loads(table.schema.metadata[SUMMARIES_METADATA_KEY])
+    return table.replace_schema_metadata(None).to_pandas(), pd.DataFrame(summaries)
@@ -0,0 +1,116 @@
+from enum import Enum
+from typing import Optional
+
+from .calculation import ScheduleTotals, schedule_totals
+from .loan_data import LoanData, LoanSummary
+from .overpayment import Overpayment, OverpaymentType
+from utils import round_math
+
+
+class GoalType(Enum):
+    PAYOFF_MONTH = 'PAYOFF_MONTH'
+    TOTAL_INTEREST = 'TOTAL_INTEREST'
+    MONTHLY_OUTLAY = 'MONTHLY_OUTLAY'
+
+
+class GoalSeekResult:
+    def __init__(self, goal_type: GoalType,
+                 target: float,
+                 value: float,
+                 summary: LoanSummary,
+                 peak_outlay: float,
+                 iterations: int,
+                 is_reachable: bool):
+        self.goal_type = goal_type
+        self.target = target
+        self.value = value
+        self.summary = summary
+        self.peak_outlay = peak_outlay
+        self.iterations = iterations
+        self.is_reachable = is_reachable
+
+    def __repr__(self):
+        return (f'GoalSeekResult(goal_type={self.goal_type.name}, '
+                f'target={self.target}, '
+                f'value={self.value}, '
+                f'iterations={self.iterations}, '
+                f'is_reachable={self.is_reachable})')
+
+
+def goal_overpayment(loan_data: LoanData, value: float, is_constant_payment: bool = False,
+                     start_month: int = 1) -> Overpayment:
+    return Overpayment(overpayment_type=OverpaymentType.FULL_TERM,
+                       start_month=start_month,
+                       end_month=loan_data.months,
+                       value=value,
+                       is_constant_payment=is_constant_payment,
+                       loan_term=loan_data.months)
+
+
+def is_goal_met(goal_type: GoalType, target: float, totals: ScheduleTotals) -> bool:
+    if goal_type == GoalType.PAYOFF_MONTH:
+        return totals.last_month <= target
+    if goal_type == GoalType.TOTAL_INTEREST:
+        return totals.summary().total_interest <= target
+    return totals.peak_outlay <= target
+
+
+def solve_overpayment(loan_data: LoanData,
+                      goal_type: GoalType,
+                      target: float,
+                      is_constant_payment: bool = False,
+                      start_month: int = 1,
+                      overpayments: Optional[list[Overpayment]] = None,
+                      tolerance: float = 0.01) -> GoalSeekResult:
+    """
+    Finds the constant monthly overpayment (FULL_TERM from start_month, on top of `overpayments`) for a goal:
+    the smallest one that pays the loan off by month `target` (PAYOFF_MONTH) or keeps the total interest
+    at or below `target` (TOTAL_INTEREST), or the largest one whose highest monthly payment plus overpayment
+    stays within `target` (MONTHLY_OUTLAY).
+    Bisects on whole cents with summary-only evaluations until the bracket is within `tolerance` PLN;
+    the returned value always meets the goal when it is reachable.
+    """
+    base = list(overpayments or [])
+    step = max(1, round(tolerance * 100))
+    iterations = 0
+
+    def evaluate(cents: int) -> ScheduleTotals:
+        nonlocal iterations
+        iterations += 1
+        overpayment = goal_overpayment(loan_data, cents / 100, is_constant_payment, start_month)
+        return schedule_totals(loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months,
+                               base + [overpayment], loan_data.rate_changes)
+
+    def result(cents: int, totals: ScheduleTotals, is_reachable: bool) -> GoalSeekResult:
+        return GoalSeekResult(goal_type=goal_type,
+                              target=target,
+                              value=cents / 100,
+                              summary=totals.summary(),
+                              peak_outlay=round_math(totals.peak_outlay, 2),
+                              iterations=iterations,
+                              is_reachable=is_reachable)
+
+    # The goal is met from some value upwards, except for MONTHLY_OUTLAY where it is met up to some value.
+    met_above = goal_type != GoalType.MONTHLY_OUTLAY
+    lo = 0
+    hi = round(loan_data.loan_amount * 100) if met_above else max(0, round(target * 100))
+    lo_totals = evaluate(lo)
+    if is_goal_met(goal_type, target, lo_totals):
+        if met_above:
+            return result(lo, lo_totals, True)
+    elif not met_above:
+        return result(lo, lo_totals, False)
+    hi_totals = evaluate(hi)
+    if is_goal_met(goal_type, target, hi_totals) != met_above:
+        return result(hi, hi_totals, not met_above)
+
+    while hi - lo > step:
+        mid = (lo + hi) // 2
+        mid_totals = evaluate(mid)
+        if is_goal_met(goal_type, target, mid_totals) == met_above:
+            hi, hi_totals = mid, mid_totals
+        else:
+            lo, lo_totals = mid, mid_totals
+    if met_above:
+        return result(hi, hi_totals, True)
+    return result(lo, lo_totals, True)
@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    import cProfile
+    import pandas as pd
+
+LOG_LEVEL_ENV = 'LOAN_CALCULATOR_LOG_LEVEL'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+logger = logging.getLogger('loan_calculator')
+logger.addHandler(logging.NullHandler())
+# Off by default: nothing below WARNING is formatted or written unless configure_logging enables it.
+logger.setLevel(logging.WARNING)
+logger.propagate = False
+
+
+def configure_logging(level: Union[int, str, None] = None, stream=None) -> bool:
+    """
+    Enables the calculator log at `level` (e.g. 'DEBUG', 'INFO'), or at the level in LOAN_CALCULATOR_LOG_LEVEL.
+    Returns False and leaves logging off when neither is set.
+    Calling it again changes the level and, if given, the stream.
+    """
+    level = level or os.environ.get(LOG_LEVEL_ENV)
+    if not level:
+        return False
+    handler = next((handler for handler in logger.handlers if handler.get_name() == logger.name), None)
+    if handler is None:
+        handler = logging.StreamHandler(stream)
+        handler.set_name(logger.name)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    elif stream is not None:
+        handler.setStream(stream)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    return True
+
+
+def format_fields(fields: dict) -> str:
+    return ' '.join(f'{key}={value!r}' for key, value in fields.items())
+
+
+def log_event(level: int, event: str, **fields):
+    """One structured line `event key=value ...`; the fields are only formatted when the level is enabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, '%s %s', event, format_fields(fields), extra={'event': event, 'fields': fields})
+
+
+class Span:
+    def __init__(self, phase: str, seconds: float, scenario: Optional[str] = None, fields: Optional[dict] = None):
+        self.phase = phase
+        self.seconds = seconds
+        self.scenario = scenario
+        self.fields = fields or {}
+
+    def __repr__(self):
+        return (f'Span(phase={self.phase}, '
+                f'scenario={self.scenario}, '
+                f'seconds={self.seconds:.6f})')
+
+
+class SpanRecorder:
+    """Collects the spans finished while it is active (see recording)."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def __len__(self):
+        return len(self.spans)
+
+    def record(self, span: Span):
+        self.spans.append(span)
+
+    def totals(self) -> dict[str, float]:
+        totals = {}
+        for span in self.spans:
+            totals[span.phase] = totals.get(span.phase, 0.0) + span.seconds
+        return totals
+
+    def to_df(self) -> 'pd.DataFrame':
+        import pandas as pd
+        return pd.DataFrame({'phase': [span.phase for span in self.spans],
+                             'scenario': [span.scenario for span in self.spans],
+                             'ms': [span.seconds * 1000 for span in self.spans],
+                             'details': [format_fields(span.fields) for span in self.spans]})
+
+
+_recorders: ContextVar[tuple[SpanRecorder, ...]] = ContextVar('span_recorders', default=())
+
+
+@contextmanager
+def recording(recorder: Optional[SpanRecorder] = None) -> Iterator[SpanRecorder]:
+    """Records every span finished in this context (thread or task) into `recorder`."""
+    recorder = SpanRecorder() if recorder is None else recorder
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+def record_spans(spans: list[Span]):
+    """Adds spans finished in another context (e.g. a worker thread or process) to the active recorders."""
+    for recorder in _recorders.get():
+        for finished in spans:
+            recorder.record(finished)
+
+
+@contextmanager
+def span(phase: str, scenario: Optional[str] = None, **fields) -> Iterator[None]:
+    """
+    Times the block as `phase` (engine, summary, plotting, rendering, ...) of `scenario`. The timing goes to the
+    active recorders and to the DEBUG log; with neither, the block runs without being timed.
+    """
+    recorders = _recorders.get()
+    if not recorders and not logger.isEnabledFor(logging.DEBUG):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        finished = Span(phase=phase, seconds=time.perf_counter() - start, scenario=scenario, fields=fields)
+        for recorder in recorders:
+            recorder.record(finished)
+        log_event(logging.DEBUG, 'span', phase=phase, scenario=scenario, ms=round(finished.seconds * 1000, 3),
+                  **fields)
+
+
+class Profile:
+    def __init__(self, profiler: 'cProfile.Profile'):
+        self.profiler = profiler
+
+    def stats(self, sort: str = 'cumulative', limit: int = 30) -> str:
+        import io
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def dump(self, path: str):
+        self.profiler.dump_stats(path)
+
+
+@contextmanager
+def profiling(enabled: bool = True) -> Iterator[Optional[Profile]]:
+    """cProfile capture of the block when enabled; yields None otherwise so call sites need no branch."""
+    if not enabled:
+        yield None
+        return
+    import cProfile
+    profile = Profile(cProfile.Profile())
+    profile.profiler.enable()
+    try:
+        yield profile
+    finally:
+        profile.profiler.disable()
@@ -1,28 +1,71 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+
+@dataclass(frozen=True, slots=True)
 class LoanData:
-    def __init__(self, loan_amount: float,
-                 loan_annual_rate: float,
-                 months: int):
-        self.loan_amount = loan_amount
-        self.loan_annual_rate = loan_annual_rate
-        self.months = months
+    loan_amount: float
+    loan_annual_rate: float
+    months: int
+    rate_changes: Optional[Mapping[int, float]] = None
+
+    def __post_init__(self):
+        # A read-only copy, so changing the caller's dict does not change the loan.
+        object.__setattr__(self, 'rate_changes', MappingProxyType(dict(self.rate_changes or {})))
+
+    def __hash__(self):
+        return hash(self.canonical())
+
+    def __reduce__(self):
+        return LoanData, (self.loan_amount, self.loan_annual_rate, self.months, dict(self.rate_changes))
 
     def __repr__(self):
         return (f'LoanData(loan_amount={self.loan_amount}, '
                 f'loan_annual_rate={self.loan_annual_rate}, '
-                f'months={self.months})')
+                f'months={self.months}, '
+                f'rate_changes={dict(self.rate_changes)})')
 
     def __str__(self):
         return (f'loan_amount={self.loan_amount}, '
                 f'loan_annual_rate={self.loan_annual_rate}, '
-                f'months={self.months}')
+                f'months={self.months}, '
+                f'rate_changes={dict(self.rate_changes)}')
 
+    def canonical(self) -> tuple:
+        return (float(self.loan_amount), float(self.loan_annual_rate), int(self.months),
+                tuple(sorted((int(month), float(rate)) for month, rate in self.rate_changes.items())))
 
+    def rate_path(self) -> Optional[list[float]]:
+        return rate_path(self.loan_annual_rate, self.months, self.rate_changes)
+
+
+@dataclass(frozen=True, slots=True)
 class LoanSummary:
-    def __init__(self, loan_amount: float, total_interest: float, total_loan_cost: float, last_month: int):
-        self.loan_amount = loan_amount
-        self.total_interest = total_interest
-        self.total_loan_cost = total_loan_cost
-        self.last_month = last_month
-        self.years = self.last_month // 12
-        self.rest_months = self.last_month - (self.years * 12)
+    loan_amount: float
+    total_interest: float
+    total_loan_cost: float
+    last_month: int
+
+    @property
+    def years(self) -> int:
+        return self.last_month // 12
+
+    @property
+    def rest_months(self) -> int:
+        return self.last_month - (self.years * 12)
+
 
+def rate_path(annual_rate: float, months: int, rate_changes: Optional[Mapping[int, float]]) -> Optional[list[float]]:
+    """Annual rate for every month, given the month from which each new rate applies; None without changes."""
+    if not rate_changes:
+        return None
+    for month in rate_changes:
+        if not 1 <= month <= months:
+            raise ValueError(f'Rate change month {month} is outside the loan term 1-{months}')
+    path = []
+    rate = annual_rate
+    for m in range(1, months + 1):
+        rate = rate_changes.get(m, rate)
+        path.append(rate)
+    return path
@@ -1,19 +1,52 @@
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SCHEDULE_COLUMNS = ['month', 'payment', 'interest', 'capital', 'overpayment', 'payment_overpayment',
+                    'remaining_balance', 'remaining_term']
+
+
+@dataclass(frozen=True, slots=True, init=False)
 class ScheduleUnit:
+    month: int
+    payment: float
+    interest: float
+    capital: float
+    overpayment: float
+    payment_overpayment: float
+    remaining_balance: float
+    remaining_term: int
+
     def __init__(self, month: int,
                  payment: float,
                  interest: float,
                  capital: float,
                  overpayment: float,
                  remaining_balance: float,
-                 remaining_term: int):
-        self.month = month
-        self.payment = payment
-        self.interest = interest
-        self.capital = capital
-        self.overpayment = overpayment
-        self.payment_overpayment = (self.payment + self.overpayment)
-        self.remaining_balance = remaining_balance
-        self.remaining_term = remaining_term
+                 remaining_term: int,
+                 payment_overpayment: Optional[float] = None):
+        set_field = object.__setattr__
+        set_field(self, 'month', month)
+        set_field(self, 'payment', payment)
+        set_field(self, 'interest', interest)
+        set_field(self, 'capital', capital)
+        set_field(self, 'overpayment', overpayment)
+        set_field(self, 'payment_overpayment',
+                  payment + overpayment if payment_overpayment is None else payment_overpayment)
+        set_field(self, 'remaining_balance', remaining_balance)
+        set_field(self, 'remaining_term', remaining_term)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'ScheduleUnit':
+        # Engine rows are in field order: fill the slots directly rather than through the frozen __init__.
+        unit = object.__new__(cls)
+        for set_field, value in zip(_FIELD_SETTERS, row):
+            set_field(unit, value)
+        return unit
 
     def __repr__(self):
         return (f'ScheduleUnit(month={self.month}, '
@@ -35,7 +68,138 @@ class ScheduleUnit:
                 f'remaining_balance={self.remaining_balance}, '
                 f'remaining_term={self.remaining_term}')
 
-    def update_overpayment_remaining_balance(self, add_overpayment: float, remaining_balance: float):
-        self.overpayment += add_overpayment
-        self.payment_overpayment = (self.payment + self.overpayment)
-        self.remaining_balance = remaining_balance
+    def update_overpayment_remaining_balance(self, add_overpayment: float, remaining_balance: float) -> 'ScheduleUnit':
+        return ScheduleUnit(month=self.month,
+                            payment=self.payment,
+                            interest=self.interest,
+                            capital=self.capital,
+                            overpayment=self.overpayment + add_overpayment,
+                            remaining_balance=remaining_balance,
+                            remaining_term=self.remaining_term)
+
+
+_FIELD_SETTERS = tuple(getattr(ScheduleUnit, name).__set__ for name in SCHEDULE_COLUMNS)
+
+
+class ScheduleColumns:
+    def __init__(self, capacity: int):
+        self.size = 0
+        self.month = np.empty(capacity, dtype=np.int64)
+        self.payment = np.empty(capacity, dtype=np.float64)
+        self.interest = np.empty(capacity, dtype=np.float64)
+        self.capital = np.empty(capacity, dtype=np.float64)
+        self.overpayment = np.empty(capacity, dtype=np.float64)
+        self.payment_overpayment = np.empty(capacity, dtype=np.float64)
+        self.remaining_balance = np.empty(capacity, dtype=np.float64)
+        self.remaining_term = np.empty(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_arrays(cls, **arrays: np.ndarray) -> 'ScheduleColumns':
+        schedule = cls(capacity=0)
+        for name in SCHEDULE_COLUMNS:
+            setattr(schedule, name, arrays[name])
+        schedule.size = len(schedule.month)
+        return schedule
+
+    def copy(self) -> 'ScheduleColumns':
+        return ScheduleColumns.from_arrays(**{name: array.copy() for name, array in self.to_dict().items()})
+
+    def __repr__(self):
+        return f'ScheduleColumns(size={self.size}, capacity={len(self.month)})'
+
+    def append(self, month: int,
+               payment: float,
+               interest: float,
+               capital: float,
+               overpayment: float,
+               payment_overpayment: float,
+               remaining_balance: float,
+               remaining_term: int):
+        i = self.size
+        self.month[i] = month
+        self.payment[i] = payment
+        self.interest[i] = interest
+        self.capital[i] = capital
+        self.overpayment[i] = overpayment
+        self.payment_overpayment[i] = payment_overpayment
+        self.remaining_balance[i] = remaining_balance
+        self.remaining_term[i] = remaining_term
+        self.size = i + 1
+
+    def row(self, idx: int) -> ScheduleUnit:
+        return ScheduleUnit.from_row((int(self.month[idx]),
+                                      float(self.payment[idx]),
+                                      float(self.interest[idx]),
+                                      float(self.capital[idx]),
+                                      float(self.overpayment[idx]),
+                                      float(self.payment_overpayment[idx]),
+                                      float(self.remaining_balance[idx]),
+                                      int(self.remaining_term[idx])))
+
+    def to_dict(self) -> dict[str, np.ndarray]:
+        return {name: getattr(self, name)[:self.size] for name in SCHEDULE_COLUMNS}
+
+    def to_df(self) -> 'pd.DataFrame':
+        import pandas as pd
+        return pd.DataFrame(self.to_dict(), columns=SCHEDULE_COLUMNS)
+
+    def to_arrow(self):
+        import pyarrow as pa
+        return pa.table(self.to_dict())
+
+
+class ScheduleBatch:
+    def __init__(self, size: int, capacity: int):
+        self.lengths = np.zeros(size, dtype=np.int64)
+        self.month = np.zeros((size, capacity), dtype=np.int64)
+        self.payment = np.zeros((size, capacity), dtype=np.float64)
+        self.interest = np.zeros((size, capacity), dtype=np.float64)
+        self.capital = np.zeros((size, capacity), dtype=np.float64)
+        self.overpayment = np.zeros((size, capacity), dtype=np.float64)
+        self.payment_overpayment = np.zeros((size, capacity), dtype=np.float64)
+        self.remaining_balance = np.zeros((size, capacity), dtype=np.float64)
+        self.remaining_term = np.zeros((size, capacity), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @classmethod
+    def concat(cls, batches: list['ScheduleBatch']) -> 'ScheduleBatch':
+        result = cls(size=sum(len(batch) for batch in batches),
+                     capacity=max((batch.month.shape[1] for batch in batches), default=0))
+        offset = 0
+        for batch in batches:
+            size, capacity = batch.month.shape
+            for name in SCHEDULE_COLUMNS:
+                getattr(result, name)[offset:offset + size, :capacity] = getattr(batch, name)
+            result.lengths[offset:offset + size] = batch.lengths
+            offset += size
+        return result
+
+    def __repr__(self):
+        return f'ScheduleBatch(size={len(self.lengths)}, capacity={self.month.shape[1]})'
+
+    def set_schedule(self, idx: int, schedule: ScheduleColumns):
+        size = len(schedule)
+        for name in SCHEDULE_COLUMNS:
+            getattr(self, name)[idx, :size] = getattr(schedule, name)[:size]
+        self.lengths[idx] = size
+
+    def schedule(self, idx: int) -> ScheduleColumns:
+        size = self.lengths[idx]
+        return ScheduleColumns.from_arrays(**{name: getattr(self, name)[idx, :size] for name in SCHEDULE_COLUMNS})
+
+    def to_df(self, idx: int) -> 'pd.DataFrame':
+        return self.schedule(idx).to_df()
+
+    def to_arrow(self, ids: Optional[np.ndarray] = None, id_column: str = 'loan_id'):
+        import pyarrow as pa
+        ids = np.arange(len(self.lengths)) if ids is None else np.asarray(ids)
+        # Row-major mask keeps each scenario's months together and drops the padding after payoff.
+        mask = np.arange(self.month.shape[1]) < self.lengths[:, None]
+        columns = {id_column: np.repeat(ids, self.lengths)}
+        columns.update({name: getattr(self, name)[mask] for name in SCHEDULE_COLUMNS})
+        return pa.table(columns)
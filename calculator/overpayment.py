@@ -1,9 +1,11 @@
-import pandas as pd
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from typing import Optional, Sequence, TYPE_CHECKING
 from utils import OVERPAYMENT_TYPE, OVERPAYMENT_START, OVERPAYMENT_END, OVERPAYMENT_VALUE, OVERPAYMENT_IS_CONSTANT
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class OverpaymentType(Enum):
     ONE_TIME = 'ONE_TIME',
@@ -11,7 +13,7 @@ class OverpaymentType(Enum):
     FULL_TERM = 'FULL_TERM'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Overpayment:
     overpayment_type: OverpaymentType = OverpaymentType.ONE_TIME
     start_month: int = 1
@@ -21,12 +23,12 @@ class Overpayment:
     loan_term: int = 300
 
     def __post_init__(self):
-        if self.overpayment_type == OverpaymentType.ONE_TIME:
-            self.end_month = self.start_month
-        elif self.end_month is None:
-            self.end_month = self.start_month
-        if self.end_month and self.end_month > self.loan_term:
-            self.end_month = self.loan_term
+        end_month = self.end_month
+        if self.overpayment_type == OverpaymentType.ONE_TIME or end_month is None:
+            end_month = self.start_month
+        if end_month and end_month > self.loan_term:
+            end_month = self.loan_term
+        object.__setattr__(self, 'end_month', end_month)
 
     def __str__(self):
         return (f'type={self.overpayment_type}, '
@@ -42,12 +44,22 @@ class Overpayment:
             OVERPAYMENT_IS_CONSTANT: self.is_constant_payment
         }
 
+    def canonical(self) -> tuple:
+        return (self.overpayment_type.name,
+                int(self.start_month),
+                int(self.end_month),
+                float(self.value),
+                bool(self.is_constant_payment))
+
 
+@dataclass(frozen=True, slots=True)
 class OverpaymentData:
-    def __init__(self, name: str,
-                 overpayments: list[Overpayment]):
-        self.name = name
-        self.overpayments = overpayments
+    """A named overpayment set. Changes return a new set (copy-on-write), so sets can be shared and hashed."""
+    name: str
+    overpayments: tuple[Overpayment, ...] = ()
+
+    def __post_init__(self):
+        object.__setattr__(self, 'overpayments', tuple(self.overpayments))
 
     def __repr__(self):
         return (f'OverpaymentData(name={self.name}, '
@@ -56,13 +68,128 @@ class OverpaymentData:
     def __str__(self):
         return f'{self.name}: {self.overpayments}'
 
-    def add_overpayment(self, overpayment: Overpayment):
-        self.overpayments.append(overpayment)
+    def canonical(self) -> tuple:
+        # Order is kept on purpose: overpayments active in the same month are applied in list order.
+        return self.name, tuple(overpayment.canonical() for overpayment in self.overpayments)
 
+    def add_overpayment(self, overpayment: Overpayment) -> 'OverpaymentData':
+        return OverpaymentData(name=self.name, overpayments=self.overpayments + (overpayment,))
 
-def overpayments_to_df(overpayments: list[Overpayment]) -> pd.DataFrame:
+    def remove_overpayment(self, idx: int) -> 'OverpaymentData':
+        return OverpaymentData(name=self.name, overpayments=self.overpayments[:idx] + self.overpayments[idx + 1:])
+
+
+def overpayments_to_df(overpayments: Sequence[Overpayment]) -> 'pd.DataFrame':
+    import pandas as pd
     if not overpayments:
         return pd.DataFrame()
 
     data = [op.convert_to_dict() for op in overpayments]
     return pd.DataFrame(data)
+
+
+class OverpaymentEvent:
+    __slots__ = ('order', 'overpayment_type', 'start', 'end', 'value', 'is_constant', 'first')
+
+    def __init__(self, order: int,
+                 overpayment_type: str,
+                 start: int,
+                 end: int,
+                 value: float,
+                 is_constant: bool,
+                 first: int):
+        self.order = order
+        self.overpayment_type = overpayment_type
+        self.start = start
+        self.end = end
+        self.value = value
+        self.is_constant = is_constant
+        self.first = first
+
+    @property
+    def is_effective(self) -> bool:
+        return self.end >= self.first
+
+    def descriptor(self) -> tuple:
+        return self.overpayment_type, self.start, self.end, self.value, self.is_constant, self.first
+
+    def __repr__(self):
+        return (f'OverpaymentEvent(order={self.order}, '
+                f'type={self.overpayment_type}, '
+                f'start={self.start}, end={self.end}, '
+                f'value={self.value}, is_constant={self.is_constant}, first={self.first})')
+
+
+class OverpaymentEvents:
+    def __init__(self):
+        self.by_start: dict[int, list[OverpaymentEvent]] = {}
+        self.events: list[OverpaymentEvent] = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f'OverpaymentEvents(count={self.count}, months={sorted(self.by_start)})'
+
+    def add(self, overpayment_type: str,
+            start: int,
+            end: int,
+            value: float,
+            is_constant: bool,
+            first_month: int = 1) -> OverpaymentEvent:
+        event = OverpaymentEvent(order=self.count,
+                                 overpayment_type=overpayment_type,
+                                 start=int(start),
+                                 end=int(end),
+                                 value=float(value),
+                                 is_constant=bool(is_constant),
+                                 first=max(int(start), first_month))
+        self.count += 1
+        self.events.append(event)
+        if event.is_effective:
+            self.by_start.setdefault(event.first, []).append(event)
+        return event
+
+    def add_overpayment(self, overpayment: Overpayment, first_month: int = 1) -> OverpaymentEvent:
+        return self.add(overpayment_type=overpayment.overpayment_type.name,
+                        start=overpayment.start_month,
+                        end=overpayment.end_month,
+                        value=overpayment.value,
+                        is_constant=overpayment.is_constant_payment,
+                        first_month=first_month)
+
+    def starting(self, month: int) -> list[OverpaymentEvent]:
+        return self.by_start.get(month, [])
+
+    def only_full_term(self) -> Optional[OverpaymentEvent]:
+        if self.count != 1:
+            return None
+        event = self.events[0]
+        if event.is_effective and event.overpayment_type == OverpaymentType.FULL_TERM.name:
+            return event
+        return None
+
+    def prefix(self, month: int, count: Optional[int] = None) -> list[OverpaymentEvent]:
+        # Events among the first `count` that can be active before `month`, in order.
+        return [event for event in self.events[:count] if event.is_effective and event.first < month]
+
+
+def compile_overpayments(overpayments: Sequence[Overpayment]) -> OverpaymentEvents:
+    events = OverpaymentEvents()
+    for overpayment in overpayments:
+        events.add_overpayment(overpayment)
+    return events
+
+
+def compile_overpayments_df(overpayments: 'pd.DataFrame') -> OverpaymentEvents:
+    events = OverpaymentEvents()
+    if overpayments.empty:
+        return events
+    for row in overpayments.to_dict('records'):
+        events.add(overpayment_type=row[OVERPAYMENT_TYPE],
+                   start=row[OVERPAYMENT_START],
+                   end=row[OVERPAYMENT_END],
+                   value=row[OVERPAYMENT_VALUE],
+                   is_constant=row[OVERPAYMENT_IS_CONSTANT])
+    return events
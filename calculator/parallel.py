@@ -0,0 +1,40 @@
+import math
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Optional, Sequence, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def resolve_workers(max_workers: Optional[int]) -> int:
+    if max_workers is None:
+        return os.cpu_count() or 1
+    return max(1, int(max_workers))
+
+
+def split_chunks(items: Sequence[T], chunk_size: int) -> list[Sequence[T]]:
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def run_chunked(func: Callable[[Sequence[T]], R],
+                items: Sequence[T],
+                max_workers: Optional[int] = None,
+                chunk_size: Optional[int] = None,
+                executor: Optional[Executor] = None) -> list[R]:
+    """
+    Calls func on consecutive chunks of items in worker processes and returns the results in chunk order,
+    so the output does not depend on which worker finished first. func must be a picklable top-level function.
+    With a single worker or a single chunk everything runs in the calling process.
+    """
+    workers = resolve_workers(max_workers)
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(items) / (workers * 4)))
+    chunks = split_chunks(items, chunk_size)
+
+    if executor is not None:
+        return list(executor.map(func, chunks))
+    if workers == 1 or len(chunks) <= 1:
+        return [func(chunk) for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return list(pool.map(func, chunks))
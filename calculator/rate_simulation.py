@@ -0,0 +1,126 @@
+from concurrent.futures import Executor
+from functools import partial
+from typing import Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+from .overpayment import Overpayment, compile_overpayments
+from .parallel import run_chunked
+from .schedule_engine import iter_amortize_batch, iter_events
+from utils import round_math_array
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SIMULATION_METRICS = ('total_interest', 'last_month', 'peak_payment')
+
+
+class RateSimulation:
+    """Per-path results of simulate_loan, indexed like the rate paths."""
+
+    def __init__(self, total_interest: np.ndarray, last_month: np.ndarray, peak_payment: np.ndarray):
+        self.total_interest = total_interest
+        self.last_month = last_month
+        self.peak_payment = peak_payment
+
+    def __len__(self):
+        return len(self.total_interest)
+
+    def __repr__(self):
+        return f'RateSimulation(paths={len(self)})'
+
+    def percentiles(self, q: Sequence[float] = (5, 25, 50, 75, 95)) -> 'pd.DataFrame':
+        import pandas as pd
+        return pd.DataFrame({metric: np.percentile(getattr(self, metric), q) for metric in SIMULATION_METRICS},
+                            index=pd.Index(q, name='percentile'))
+
+
+def simulate_rate_paths(paths: int,
+                        months: int,
+                        initial_rate: float,
+                        margin: float = 0.0,
+                        mean_rate: Optional[float] = None,
+                        mean_reversion: float = 0.02,
+                        volatility: float = 0.002,
+                        reset_months: int = 6,
+                        seed: Optional[int] = None) -> np.ndarray:
+    """
+    Annual rate paths of shape (paths, months): a reference rate (e.g. WIBOR) that follows a monthly
+    mean-reverting random walk floored at 0, fixed every `reset_months` months, plus `margin`.
+    """
+    rng = np.random.default_rng(seed)
+    mean_rate = initial_rate if mean_rate is None else mean_rate
+    reference = np.empty((paths, months))
+    rate = np.full(paths, float(initial_rate))
+    for m in range(months):
+        reference[:, m] = rate
+        rate = np.maximum(rate + mean_reversion * (mean_rate - rate) + volatility * rng.standard_normal(paths), 0.0)
+    fixings = (np.arange(months) // reset_months) * reset_months
+    return reference[:, fixings] + margin
+
+
+def load_rate_paths(path: str) -> np.ndarray:
+    """Rate paths saved with numpy.save (.npy) or as CSV with one path per row and one month per column."""
+    if path.endswith('.npy'):
+        return np.load(path)
+    return np.loadtxt(path, delimiter=',', ndmin=2)
+
+
+def simulate_loan(principal: float,
+                  months: int,
+                  rate_paths: np.ndarray,
+                  overpayments: Optional[list[Overpayment]] = None,
+                  chunk_size: int = 2000,
+                  max_workers: Optional[int] = 1,
+                  executor: Optional[Executor] = None) -> RateSimulation:
+    """
+    Runs the loan once per rate path (row of `rate_paths`, annual rates per month) with the overpayment
+    rules of generate_schedule, recomputing the payment at every rate change. Without overpayments or with a
+    single FULL_TERM one all paths of a chunk go through the vectorized kernel together; other overpayment
+    sets run path by path. Only `chunk_size` paths are in flight at once, per worker.
+    """
+    rate_paths = np.asarray(rate_paths, dtype=np.float64)
+    if rate_paths.ndim != 2 or rate_paths.shape[1] < months:
+        raise ValueError(f'Expected rate paths of shape (paths, {months}), got {rate_paths.shape}')
+    parts = run_chunked(partial(_simulate_chunk, principal, months, list(overpayments or [])),
+                        rate_paths[:, :months],
+                        max_workers=max_workers,
+                        chunk_size=chunk_size,
+                        executor=executor)
+    total_interest, last_month, peak_payment = (np.concatenate(part) for part in zip(*parts))
+    return RateSimulation(total_interest=total_interest, last_month=last_month, peak_payment=peak_payment)
+
+
+def _simulate_chunk(principal: float,
+                    months: int,
+                    overpayments: list[Overpayment],
+                    rate_paths: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    paths = len(rate_paths)
+    total_interest = np.zeros(paths)
+    last_month = np.zeros(paths, dtype=np.int64)
+    peak_payment = np.zeros(paths)
+    events = compile_overpayments(overpayments)
+    full_term = events.only_full_term()
+
+    if not events or full_term is not None:
+        value, start, end, is_constant_payment = (full_term.value, full_term.start, full_term.end,
+                                                  full_term.is_constant) if full_term else (0.0, 1, 0, False)
+        for m, lanes, payment, interest, _capital, _overpayment, _payment_overpayment, _balance in \
+                iter_amortize_batch(principal=np.full(paths, principal),
+                                    annual_rate=rate_paths[:, 0],
+                                    months=np.full(paths, months, dtype=np.int64),
+                                    value=np.full(paths, value),
+                                    start=np.full(paths, start, dtype=np.int64),
+                                    end=np.full(paths, end, dtype=np.int64),
+                                    is_constant_payment=np.full(paths, is_constant_payment),
+                                    rate_paths=rate_paths):
+            total_interest[lanes] += interest
+            last_month[lanes] = m
+            peak_payment[lanes] = np.maximum(peak_payment[lanes], payment)
+    else:
+        for idx, rates in enumerate(rate_paths.tolist()):
+            for row in iter_events(principal, rates[0], months, compile_overpayments(overpayments), rates=rates):
+                total_interest[idx] += row[2]
+                last_month[idx] = row[0]
+                peak_payment[idx] = max(peak_payment[idx], row[1])
+    return round_math_array(total_interest, 2), last_month, peak_payment
@@ -0,0 +1,102 @@
+import logging
+import math
+from concurrent.futures import Executor, Future, wait
+from typing import Optional
+
+from .cache import CachedSchedule
+from .calculation import Result, cached_schedules
+from .instrumentation import Span, log_event, record_spans, recording, span
+from .loan_data import LoanData
+from .overpayment import Overpayment, OverpaymentData
+from .parallel import split_chunks
+
+# The scenarios of a job are split into this many tasks at most, which is also the resolution of its progress.
+RESULT_JOB_CHUNKS = 4
+
+
+def chunk_schedules(scenarios: list[tuple[float, float, int, list[Overpayment]]],
+                    rate_changes: Optional[dict[int, float]] = None,
+                    labels: Optional[list[str]] = None) -> tuple[list[CachedSchedule], list[Span]]:
+    """
+    One chunk of a ResultJob, through the schedule cache of the process that runs it, with the spans it
+    finished. Workers do not see the caller's recorders, so the job records the spans when it collects the result.
+    """
+    with recording() as recorder:
+        entries = cached_schedules(scenarios, rate_changes=rate_changes, labels=labels)
+    return entries, recorder.spans
+
+
+class ResultJob:
+    """
+    calculate_result as a background job: the scenarios are split into chunks, each computed by cached_schedules
+    as a task on `executor` (threads share the schedule cache, worker processes keep their own), so the caller
+    can show progress and the finished scenarios while the rest are computed. The job keeps its finished
+    scenarios, so polling it again recomputes nothing.
+    """
+
+    def __init__(self,
+                 loan_data: LoanData,
+                 overpayments_set: list[OverpaymentData],
+                 executor: Executor,
+                 no_overpayment_name: str = 'No overpayment',
+                 chunk_size: Optional[int] = None):
+        self.names = [no_overpayment_name] + [overpayment_data.name for overpayment_data in overpayments_set]
+        if len(set(self.names)) != len(self.names):
+            # The result is keyed by name, so a repeated name would hide one of the scenarios.
+            raise ValueError('Scenario names must be unique')
+        scenarios = [(loan_data.loan_amount, loan_data.loan_annual_rate, loan_data.months, overpayments)
+                     for overpayments in [[]] + [data.overpayments for data in overpayments_set]]
+        # A plain dict, as the read-only rate changes of LoanData cannot be pickled for worker processes.
+        rate_changes = dict(loan_data.rate_changes) or None
+        chunk_size = chunk_size or math.ceil(len(scenarios) / RESULT_JOB_CHUNKS)
+        self.chunks = split_chunks(self.names, chunk_size)
+        log_event(logging.INFO, 'result_job_submitted', loan_data=str(loan_data), scenarios=self.names,
+                  chunks=len(self.chunks))
+        self.futures: list[Future] = [
+            executor.submit(chunk_schedules, chunk, rate_changes, names)
+            for chunk, names in zip(split_chunks(scenarios, chunk_size), self.chunks)]
+        self._schedules = {}
+        self._summarises = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def progress(self) -> tuple[int, int]:
+        """Scenarios done and in total; a chunk counts once all of its scenarios are done."""
+        return sum(len(names) for names, future in zip(self.chunks, self.futures) if future.done()), len(self.names)
+
+    @property
+    def finished(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to `timeout` seconds for the remaining scenarios; returns whether all of them are done."""
+        return not wait(self.futures, timeout=timeout).not_done
+
+    def cancel(self):
+        """Drops the scenarios not started yet; the running ones finish into the schedule cache."""
+        cancelled = sum(len(names) for names, future in zip(self.chunks, self.futures) if future.cancel())
+        log_event(logging.DEBUG, 'result_job_cancelled', cancelled=cancelled, scenarios=len(self.names))
+
+    def partial_result(self) -> Result:
+        """
+        The scenarios finished so far, in scenario order. Each chunk's spans go to the recorders active when it
+        is collected here. Raises the error of a chunk that failed.
+        """
+        for names, future in zip(self.chunks, self.futures):
+            if names[0] in self._schedules or not future.done():
+                continue
+            entries, spans = future.result()
+            record_spans(spans)
+            for name, entry in zip(names, entries):
+                self._summarises[name] = entry.summary
+                with span('frame', scenario=name):
+                    self._schedules[name] = entry.schedule.to_df()
+        names = [name for name in self.names if name in self._schedules]
+        return Result(schedules={name: self._schedules[name] for name in names},
+                      summarises={name: self._summarises[name] for name in names})
+
+    def result(self) -> Result:
+        """The complete result, same as calculate_result; waits for the remaining scenarios."""
+        self.wait()
+        return self.partial_result()
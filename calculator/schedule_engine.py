@@ -0,0 +1,620 @@
+from operator import attrgetter
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+
+from utils import round_cents, round_cents_array, round_half_up, round_half_up_array, to_cents, to_cents_array
+from .loan_schedule import SCHEDULE_COLUMNS, ScheduleBatch, ScheduleColumns
+from .overpayment import Overpayment, OverpaymentEvent, OverpaymentEvents, OverpaymentType, compile_overpayments
+
+
+def annuity_factor(monthly_rate: float, months: int) -> tuple[float, float]:
+    # Same expression as numpy_financial.pmt, so saldo * temp / fact is bit-identical to npf.pmt(r, n, -saldo).
+    if monthly_rate == 0:
+        return 1.0, float(months)
+    temp = (1 + np.array(monthly_rate)) ** np.array(months)
+    return float(temp), float((temp - 1) / monthly_rate)
+
+
+def annuity_factors(monthly_rate: np.ndarray, months: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # annuity_factor() for arrays of rates and terms.
+    is_zero_rate = monthly_rate == 0
+    masked_rate = np.where(is_zero_rate, 1.0, monthly_rate)
+    temp = np.where(is_zero_rate, 1.0, (1 + monthly_rate) ** months)
+    fact = np.where(is_zero_rate, months.astype(np.float64), (temp - 1) / masked_rate)
+    return temp, fact
+
+
+def rebased_payment(saldo: float, temp: float, fact: float, monthly_overpayment_value: float,
+                    cents: bool = False) -> float:
+    """
+    Constant payment after a rate change: the remaining balance is re-amortized over the remaining term at
+    the new rate and a constant-payment overpayment keeps its monthly saving on top of the new installment.
+    Works on scalars and arrays alike.
+    """
+    if isinstance(saldo, np.ndarray):
+        rnd_array = round_half_up_array if cents else round_cents_array
+        return rnd_array(rnd_array(saldo * temp / fact) + monthly_overpayment_value)
+    rnd = round_half_up if cents else round_cents
+    return rnd(rnd(saldo * temp / fact) + monthly_overpayment_value)
+
+
+def rounding(cents: bool) -> tuple:
+    """
+    (scalar rounding, array rounding) of the month loops. Amounts are PLN rounded half-up to the cent,
+    or, in the cents mode, whole cents rounded half-up to an integer so that every sum is exact.
+    """
+    if cents:
+        return round_half_up, round_half_up_array
+    return round_cents, round_cents_array
+
+
+def row_from_cents(row: tuple) -> tuple:
+    month, payment, interest, capital, overpayment, payment_overpayment, remaining_balance, remaining_term = row
+    return (month, payment / 100, interest / 100, capital / 100, overpayment / 100, payment_overpayment / 100,
+            remaining_balance / 100, remaining_term)
+
+
+def amortize(principal: float,
+             annual_rate: float,
+             months: int,
+             value: float = 0.0,
+             start: int = 1,
+             end: int = 0,
+             is_constant_payment: bool = False,
+             rates: Optional[Sequence[float]] = None,
+             cents: bool = False) -> ScheduleColumns:
+    """
+    Schedule for a loan without overpayments or with a single FULL_TERM overpayment active in [start, end].
+    Returns the schedule as columns, cent-for-cent equal to the generic month loop.
+    """
+    schedule = ScheduleColumns(capacity=months)
+    for row in iter_amortize(principal, annual_rate, months, value, start, end, is_constant_payment, rates, cents):
+        schedule.append(*row)
+    return schedule
+
+
+def rate_segments(annual_rate: float, months: int, rates: Optional[Sequence[float]]) -> list[tuple[int, float]]:
+    # (first month, annual rate) of every constant-rate stretch of the loan.
+    if rates is None:
+        return [(1, annual_rate)]
+    segments = [(1, rates[0])]
+    for m in range(2, months + 1):
+        if rates[m - 1] != segments[-1][1]:
+            segments.append((m, rates[m - 1]))
+    return segments
+
+
+def iter_amortize(principal: float,
+                  annual_rate: float,
+                  months: int,
+                  value: float = 0.0,
+                  start: int = 1,
+                  end: int = 0,
+                  is_constant_payment: bool = False,
+                  rates: Optional[Sequence[float]] = None,
+                  cents: bool = False) -> Iterator[tuple]:
+    # Yields one tuple per month in SCHEDULE_COLUMNS order.
+    # rates[m - 1] is the annual rate in month m; it replaces annual_rate when given (see rebased_payment).
+    # With cents the loop runs on integer cents (see rounding) and the rows are converted back to PLN.
+    rnd, rnd_array = rounding(cents)
+    if cents:
+        principal, value = to_cents(principal), to_cents(value)
+    segments = rate_segments(annual_rate, months, rates)
+    saldo = rnd(principal)
+    balance = saldo
+    monthly_overpayment_value = 0.0
+    const_payment = 0.0
+
+    for idx, (first, segment_rate) in enumerate(segments):
+        last = segments[idx + 1][0] - 1 if idx + 1 < len(segments) else months
+        r = segment_rate / 12
+        temp, fact = annuity_factor(r, months - first + 1)
+        if first == 1:
+            const_payment = rnd(saldo * temp / fact)
+        else:
+            saldo = balance
+            const_payment = rebased_payment(saldo, temp, fact, monthly_overpayment_value, cents)
+
+        if is_constant_payment:
+            payments = None
+        else:
+            # Without a constant payment the saldo only drops by the overpayment value in active months,
+            # so the payment column of the whole segment is known up front.
+            decrement = rnd(rnd(value + monthly_overpayment_value))
+            steps = np.zeros(last - first + 1, dtype=np.float64)
+            steps[max(start, first) - first:max(0, min(end, last) - first + 1)] = decrement
+            saldo_path = np.subtract.accumulate(np.concatenate(([saldo], steps[:-1])))
+            payments = rnd_array(saldo_path * temp / fact).tolist()
+
+        for m in range(first, last + 1):
+            payment = payments[m - first] if payments is not None else rnd(saldo * temp / fact)
+            interest = rnd(balance * r)
+            capital = rnd(payment - interest)
+            overpayment = 0.0
+            payment_overpayment = None
+
+            if balance <= capital:
+                payment = interest + balance
+                capital = balance
+                new_balance = 0.0
+            elif balance <= (capital + monthly_overpayment_value):
+                overpayment = rnd(balance - capital)
+                capital = balance
+                new_balance = 0.0
+            elif start <= m <= end:
+                if balance <= (value + monthly_overpayment_value + capital):
+                    overpayment = rnd(balance - capital)
+                    total_capital = rnd(capital + overpayment)
+                    new_balance = rnd(balance - total_capital)
+                    # The generic loop leaves payment_overpayment untouched on an overpayment payoff month.
+                    payment_overpayment = payment + 0.0
+                else:
+                    overpayment = rnd(value + monthly_overpayment_value)
+                    saldo -= rnd(overpayment)
+                    if is_constant_payment:
+                        new_payment = rnd(saldo * temp / fact)
+                        monthly_overpayment_value = rnd(const_payment - new_payment)
+                    total_capital = rnd(capital + overpayment)
+                    new_balance = balance - total_capital
+            else:
+                new_balance = rnd(balance - capital)
+
+            if payment_overpayment is None:
+                payment_overpayment = payment + overpayment
+            row = (m, payment, interest, capital, overpayment, payment_overpayment, new_balance, months - m + 1)
+            yield row_from_cents(row) if cents else row
+
+            balance = new_balance
+            if balance <= 0:
+                return
+
+
+class ScheduleCheckpoint:
+    """
+    Loop state at the start of `month`. Events are referenced as ('o', i), the i-th overpayment that can be
+    active before `month`, or ('d', j), the j-th derived event, so the checkpoint stays valid for any
+    overpayment list that shares that prefix.
+    """
+    __slots__ = ('month', 'saldo', 'const_saldo', 'const_payment', 'monthly_overpayment_value',
+                 'remaining_balance', 'derived', 'active', 'range_monthly_overpayment_value')
+
+    def __init__(self, month: int,
+                 saldo: float,
+                 const_saldo: float,
+                 const_payment: float,
+                 monthly_overpayment_value: float,
+                 remaining_balance: float,
+                 derived: list[tuple],
+                 active: list[tuple[str, int]],
+                 range_monthly_overpayment_value: dict[tuple[str, int], float]):
+        self.month = month
+        self.saldo = saldo
+        self.const_saldo = const_saldo
+        self.const_payment = const_payment
+        self.monthly_overpayment_value = monthly_overpayment_value
+        self.remaining_balance = remaining_balance
+        self.derived = derived
+        self.active = active
+        self.range_monthly_overpayment_value = range_monthly_overpayment_value
+
+    def __repr__(self):
+        return (f'ScheduleCheckpoint(month={self.month}, '
+                f'remaining_balance={self.remaining_balance}, '
+                f'derived={len(self.derived)}, active={self.active})')
+
+
+class CheckpointedSchedule:
+    def __init__(self, principal: float,
+                 annual_rate: float,
+                 months: int,
+                 events: OverpaymentEvents,
+                 originals: int,
+                 schedule: ScheduleColumns,
+                 checkpoints: list[ScheduleCheckpoint],
+                 resumed_from: int):
+        self.principal = principal
+        self.annual_rate = annual_rate
+        self.months = months
+        self.events = events
+        self.originals = originals
+        self.schedule = schedule
+        self.checkpoints = checkpoints
+        self.resumed_from = resumed_from
+
+    def __repr__(self):
+        return (f'CheckpointedSchedule(months={len(self.schedule)}, '
+                f'checkpoints={[checkpoint.month for checkpoint in self.checkpoints]}, '
+                f'resumed_from={self.resumed_from})')
+
+    def resume_month(self, principal: float, annual_rate: float, months: int, events: OverpaymentEvents) -> int:
+        """Latest checkpoint month that is still valid for the given loan and overpayments, 1 if none."""
+        if (principal, annual_rate, months) != (self.principal, self.annual_rate, self.months):
+            return 1
+        for checkpoint in reversed(self.checkpoints):
+            old_prefix = self.events.prefix(checkpoint.month, self.originals)
+            new_prefix = events.prefix(checkpoint.month)
+            if [event.descriptor() for event in old_prefix] == [event.descriptor() for event in new_prefix]:
+                return checkpoint.month
+        return 1
+
+
+def schedule_overpayments(principal: float,
+                          annual_rate: float,
+                          months: int,
+                          events: OverpaymentEvents,
+                          rates: Optional[Sequence[float]] = None,
+                          cents: bool = False) -> ScheduleColumns:
+    """
+    Generic month loop. Only the events active in month m are visited, in the order the overpayments were
+    given; events derived from constant-payment overpayments are appended to the table as they fire.
+    """
+    return _run_events(principal, annual_rate, months, events, rates=rates, cents=cents).schedule
+
+
+def schedule_with_checkpoints(principal: float,
+                              annual_rate: float,
+                              months: int,
+                              overpayments: list[Overpayment],
+                              checkpoint_interval: int = 12,
+                              previous: Optional[CheckpointedSchedule] = None) -> CheckpointedSchedule:
+    """
+    schedule_overpayments() that stores its loop state every `checkpoint_interval` months. With `previous`
+    (an earlier run for the same loan) only the months after the latest checkpoint that precedes every
+    changed overpayment are recomputed.
+    """
+    events = compile_overpayments(overpayments)
+    if previous is None:
+        return _run_events(principal, annual_rate, months, events, checkpoint_interval=checkpoint_interval)
+    resume_month = previous.resume_month(principal, annual_rate, months, events)
+    if resume_month == 1:
+        return _run_events(principal, annual_rate, months, events, checkpoint_interval=checkpoint_interval)
+    checkpoint = next(checkpoint for checkpoint in previous.checkpoints if checkpoint.month == resume_month)
+    return _run_events(principal, annual_rate, months, events,
+                       checkpoint_interval=checkpoint_interval,
+                       resume=checkpoint,
+                       previous=previous)
+
+
+def _run_events(principal: float,
+                annual_rate: float,
+                months: int,
+                events: OverpaymentEvents,
+                checkpoint_interval: int = 0,
+                resume: Optional[ScheduleCheckpoint] = None,
+                previous: Optional[CheckpointedSchedule] = None,
+                rates: Optional[Sequence[float]] = None,
+                cents: bool = False) -> CheckpointedSchedule:
+    originals = len(events)
+    schedule = ScheduleColumns(capacity=months)
+    checkpoints: list[ScheduleCheckpoint] = []
+    if resume is not None:
+        for name in SCHEDULE_COLUMNS:
+            getattr(schedule, name)[:resume.month - 1] = getattr(previous.schedule, name)[:resume.month - 1]
+        schedule.size = resume.month - 1
+        checkpoints = [checkpoint for checkpoint in previous.checkpoints if checkpoint.month <= resume.month]
+
+    for row in iter_events(principal, annual_rate, months, events,
+                           checkpoint_interval=checkpoint_interval,
+                           resume=resume,
+                           checkpoints=checkpoints,
+                           rates=rates,
+                           cents=cents):
+        schedule.append(*row)
+
+    return CheckpointedSchedule(principal=principal,
+                                annual_rate=annual_rate,
+                                months=months,
+                                events=events,
+                                originals=originals,
+                                schedule=schedule,
+                                checkpoints=checkpoints,
+                                resumed_from=1 if resume is None else resume.month)
+
+
+def iter_events(principal: float,
+                annual_rate: float,
+                months: int,
+                events: OverpaymentEvents,
+                checkpoint_interval: int = 0,
+                resume: Optional[ScheduleCheckpoint] = None,
+                checkpoints: Optional[list[ScheduleCheckpoint]] = None,
+                rates: Optional[Sequence[float]] = None,
+                cents: bool = False) -> Iterator[tuple]:
+    # Yields one tuple per month in SCHEDULE_COLUMNS order, starting at resume.month when resuming.
+    # rates[m - 1] is the annual rate in month m; it replaces annual_rate when given (see rebased_payment).
+    # With cents the loop runs on integer cents (see rounding); event values stay in PLN.
+    if (rates is not None or cents) and resume is not None:
+        raise ValueError('Resuming from a checkpoint is not supported with a rate path or in cents')
+    if rates is not None:
+        annual_rate = rates[0]
+    rnd, _rnd_array = rounding(cents)
+    scale = 100 if cents else 1
+    if cents:
+        principal = to_cents(principal)
+    r = annual_rate / 12
+    temp, fact = annuity_factor(r, months)
+    originals = len(events)
+
+    if resume is None:
+        first_month = 1
+        saldo = rnd(principal)
+        monthly_overpayment_value = 0.0
+        range_monthly_overpayment_value = {}
+        remaining_balance = rnd(principal)
+        const_payment = rnd(saldo * temp / fact)
+        const_saldo = rnd(principal)
+        active: list[OverpaymentEvent] = []
+    else:
+        first_month = resume.month
+        saldo = resume.saldo
+        monthly_overpayment_value = resume.monthly_overpayment_value
+        remaining_balance = resume.remaining_balance
+        const_payment = resume.const_payment
+        const_saldo = resume.const_saldo
+        prefix = events.prefix(first_month)
+        derived = [events.add(*descriptor[:5], first_month=descriptor[5]) for descriptor in resume.derived]
+        lookup = {'o': prefix, 'd': derived}
+        active = [lookup[kind][idx] for kind, idx in resume.active]
+        range_monthly_overpayment_value = {lookup[kind][idx].order: value
+                                           for (kind, idx), value in resume.range_monthly_overpayment_value.items()}
+
+    next_checkpoint = first_month + checkpoint_interval if checkpoint_interval and checkpoints is not None \
+        else months + 1
+
+    for m in range(first_month, months + 1):
+        if m == next_checkpoint:
+            next_checkpoint += checkpoint_interval
+            checkpoints.append(_checkpoint(m, events, originals, active, saldo, const_saldo, const_payment,
+                                           monthly_overpayment_value, remaining_balance,
+                                           range_monthly_overpayment_value))
+
+        if rates is not None and rates[m - 1] / 12 != r:
+            r = rates[m - 1] / 12
+            temp, fact = annuity_factor(r, months - m + 1)
+            const_saldo = remaining_balance + (const_saldo - saldo)
+            saldo = remaining_balance
+            const_payment = rebased_payment(saldo, temp, fact, monthly_overpayment_value, cents)
+
+        if active:
+            active = [event for event in active if event.end >= m]
+        starting = events.starting(m)
+        if starting:
+            active = sorted(active + starting, key=attrgetter('order'))
+
+        payment = rnd(saldo * temp / fact)
+        interest = rnd(remaining_balance * r)
+        capital = rnd(payment - interest)
+        unit_overpayment = 0.0
+        unit_payment_overpayment = payment + unit_overpayment
+        unit_remaining_balance = rnd(remaining_balance - capital)
+
+        if remaining_balance <= capital:
+            payment = interest + remaining_balance
+            capital = remaining_balance
+            unit_payment_overpayment = payment + unit_overpayment
+            unit_remaining_balance = 0.0
+
+        elif remaining_balance <= (capital + monthly_overpayment_value):
+            unit_overpayment = rnd(remaining_balance - capital)
+            unit_payment_overpayment = payment + unit_overpayment
+            unit_remaining_balance = 0.0
+            capital = remaining_balance
+
+        else:
+            for event in active:
+                overpayment = to_cents(event.value) if cents else event.value
+                if remaining_balance <= (overpayment + monthly_overpayment_value + capital):
+                    full_overpayment = rnd(remaining_balance - capital)
+                    total_capital = rnd(capital + full_overpayment)
+                    remaining_balance = rnd(remaining_balance - total_capital)
+                    unit_overpayment = full_overpayment
+                    unit_remaining_balance = remaining_balance  # should be 0.0
+                    break
+
+                full_overpayment = rnd(overpayment + monthly_overpayment_value)
+                saldo -= rnd(full_overpayment)
+                if event.is_constant:
+                    overpayment_type = event.overpayment_type
+                    if overpayment_type == OverpaymentType.ONE_TIME.name:
+                        new_payment = rnd(saldo * temp / fact)
+                        delta = const_payment - new_payment
+                        const_payment = new_payment
+                        events.add_overpayment(Overpayment(overpayment_type=OverpaymentType.RANGE,
+                                                           start_month=event.start + 1,
+                                                           end_month=months,
+                                                           value=delta / scale,
+                                                           is_constant_payment=True),
+                                               first_month=m + 1)
+
+                    elif overpayment_type == OverpaymentType.RANGE.name and event.end == m:
+                        new_payment = rnd(saldo * temp / fact)
+                        delta = const_payment - new_payment
+                        const_payment = new_payment
+                        monthly_overpayment_value = range_monthly_overpayment_value[event.order]
+                        events.add_overpayment(Overpayment(overpayment_type=OverpaymentType.RANGE,
+                                                           start_month=event.end + 1,
+                                                           end_month=months,
+                                                           value=delta / scale,
+                                                           is_constant_payment=True),
+                                               first_month=m + 1)
+                    else:
+                        if overpayment_type == OverpaymentType.RANGE.name and event.start == m:
+                            range_monthly_overpayment_value[event.order] = monthly_overpayment_value
+                        new_payment = rnd(saldo * temp / fact)
+                        delta = const_payment - new_payment
+                        monthly_overpayment_value = rnd(delta)
+
+                else:
+                    const_saldo -= rnd(overpayment)
+                    new_payment = rnd(const_saldo * temp / fact)
+                    const_payment = new_payment
+
+                total_capital = rnd(capital + full_overpayment)
+                remaining_balance -= total_capital
+                unit_overpayment += full_overpayment
+                unit_payment_overpayment = payment + unit_overpayment
+                unit_remaining_balance = remaining_balance
+
+        row = (m, payment, interest, capital, unit_overpayment, unit_payment_overpayment, unit_remaining_balance,
+               months - m + 1)
+        yield row_from_cents(row) if cents else row
+        remaining_balance = unit_remaining_balance
+
+        if remaining_balance <= 0:
+            break
+
+
+def _checkpoint(month: int,
+                events: OverpaymentEvents,
+                originals: int,
+                active: list[OverpaymentEvent],
+                saldo: float,
+                const_saldo: float,
+                const_payment: float,
+                monthly_overpayment_value: float,
+                remaining_balance: float,
+                range_monthly_overpayment_value: dict[int, float]) -> ScheduleCheckpoint:
+    refs = {event.order: ('o', idx) for idx, event in enumerate(events.prefix(month, originals))}
+    derived = events.events[originals:]
+    refs.update({event.order: ('d', idx) for idx, event in enumerate(derived)})
+    return ScheduleCheckpoint(month=month,
+                              saldo=saldo,
+                              const_saldo=const_saldo,
+                              const_payment=const_payment,
+                              monthly_overpayment_value=monthly_overpayment_value,
+                              remaining_balance=remaining_balance,
+                              derived=[event.descriptor() for event in derived],
+                              active=[refs[event.order] for event in active],
+                              range_monthly_overpayment_value={refs[order]: value for order, value
+                                                               in range_monthly_overpayment_value.items()})
+
+
+def amortize_batch(principal: np.ndarray,
+                   annual_rate: np.ndarray,
+                   months: np.ndarray,
+                   value: np.ndarray,
+                   start: np.ndarray,
+                   end: np.ndarray,
+                   is_constant_payment: np.ndarray,
+                   batch: ScheduleBatch,
+                   rows: np.ndarray,
+                   cents: bool = False):
+    """
+    amortize() for many scenarios at once: every array holds one entry per scenario and the month loop
+    advances all of them together. Scenario i is written to row rows[i] of the batch; months after a
+    scenario is paid off (or its term ends) are left as zero padding.
+    """
+    months = np.asarray(months, dtype=np.int64)
+    for m, lanes, payment, interest, capital, overpayment, payment_overpayment, new_balance in \
+            iter_amortize_batch(principal, annual_rate, months, value, start, end, is_constant_payment, cents=cents):
+        row = rows[lanes]
+        col = m - 1
+        batch.month[row, col] = m
+        batch.payment[row, col] = payment
+        batch.interest[row, col] = interest
+        batch.capital[row, col] = capital
+        batch.overpayment[row, col] = overpayment
+        batch.payment_overpayment[row, col] = payment_overpayment
+        batch.remaining_balance[row, col] = new_balance
+        batch.remaining_term[row, col] = months[lanes] - m + 1
+        batch.lengths[row] = m
+
+
+def iter_amortize_batch(principal: np.ndarray,
+                        annual_rate: np.ndarray,
+                        months: np.ndarray,
+                        value: np.ndarray,
+                        start: np.ndarray,
+                        end: np.ndarray,
+                        is_constant_payment: np.ndarray,
+                        rate_paths: Optional[np.ndarray] = None,
+                        cents: bool = False) -> Iterator[tuple]:
+    # Yields (month, lanes, payment, interest, capital, overpayment, payment_overpayment, remaining_balance)
+    # for every month, where lanes are the indices of the scenarios still running and the arrays are theirs.
+    # rate_paths[i, m - 1] is the annual rate of scenario i in month m; it replaces annual_rate when given
+    # and the payment is rebased (see rebased_payment) whenever the rate changes.
+    # With cents the money arrays are int64 cents (see rounding) and the yielded ones are converted to PLN.
+    rnd, rnd_array = rounding(cents)
+    principal = np.asarray(principal, dtype=np.float64)
+    if rate_paths is not None:
+        rate_paths = np.asarray(rate_paths, dtype=np.float64)
+        annual_rate = rate_paths[:, 0]
+    r = np.array(annual_rate, dtype=np.float64) / 12
+    months = np.asarray(months, dtype=np.int64)
+    value = np.asarray(value, dtype=np.float64)
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    is_constant_payment = np.asarray(is_constant_payment, dtype=bool)
+    if not len(principal):
+        return
+    if cents:
+        principal, value = to_cents_array(principal), to_cents_array(value)
+
+    temp, fact = annuity_factors(r, months)
+
+    saldo = rnd_array(principal)
+    balance = saldo.copy()
+    monthly_overpayment_value = np.zeros_like(saldo)
+    const_payment = rnd_array(saldo * temp / fact)
+    alive = months > 0
+
+    for m in range(1, int(months.max()) + 1):
+        if not alive.any():
+            break
+        lanes = np.flatnonzero(alive)
+        if rate_paths is not None and m > 1:
+            new_rate = rate_paths[lanes, m - 1] / 12
+            changed = new_rate != r[lanes]
+            if changed.any():
+                reset = lanes[changed]
+                r[reset] = new_rate[changed]
+                temp[reset], fact[reset] = annuity_factors(r[reset], months[reset] - m + 1)
+                saldo[reset] = balance[reset]
+                const_payment[reset] = rebased_payment(saldo[reset], temp[reset], fact[reset],
+                                                       monthly_overpayment_value[reset], cents)
+        b = balance[lanes]
+        s = saldo[lanes]
+        mov = monthly_overpayment_value[lanes]
+        v = value[lanes]
+
+        payment = rnd_array(s * temp[lanes] / fact[lanes])
+        interest = rnd_array(b * r[lanes])
+        capital = rnd_array(payment - interest)
+
+        paid_off = b <= capital
+        paid_off_monthly = ~paid_off & (b <= (capital + mov))
+        in_window = ~paid_off & ~paid_off_monthly & (start[lanes] <= m) & (m <= end[lanes])
+        paid_off_overpayment = in_window & (b <= (v + mov + capital))
+        overpaid = in_window & ~paid_off_overpayment
+
+        full_overpayment = rnd_array(v + mov)
+        final_overpayment = rnd_array(b - capital)
+        overpayment = np.where(overpaid, full_overpayment,
+                               np.where(paid_off_monthly | paid_off_overpayment, final_overpayment, 0.0))
+        payment_overpayment = np.where(paid_off | paid_off_overpayment, payment + 0.0, payment + overpayment)
+        payment = np.where(paid_off, interest + b, payment)
+        payment_overpayment = np.where(paid_off, payment + 0.0, payment_overpayment)
+
+        new_balance = np.where(in_window, 0.0, rnd_array(b - capital))
+        new_balance = np.where(paid_off_overpayment,
+                               rnd_array(b - rnd_array(capital + final_overpayment)),
+                               new_balance)
+        new_balance = np.where(overpaid, b - rnd_array(capital + full_overpayment), new_balance)
+        new_balance = np.where(paid_off | paid_off_monthly, 0.0, new_balance)
+        capital = np.where(paid_off | paid_off_monthly, b, capital)
+
+        new_saldo = np.where(overpaid, s - rnd_array(full_overpayment), s)
+        constant = overpaid & is_constant_payment[lanes]
+        new_payment = rnd_array(new_saldo * temp[lanes] / fact[lanes])
+        new_monthly = rnd_array(const_payment[lanes] - new_payment)
+        monthly_overpayment_value[lanes] = np.where(constant, new_monthly, mov)
+        saldo[lanes] = new_saldo
+        balance[lanes] = new_balance
+
+        if cents:
+            yield (m, lanes, payment / 100, interest / 100, capital / 100, overpayment / 100,
+                   payment_overpayment / 100, new_balance / 100)
+        else:
+            yield m, lanes, payment, interest, capital, overpayment, payment_overpayment, new_balance
+        alive[lanes] = (new_balance > 0) & (m < months[lanes])
@@ -0,0 +1,113 @@
+from concurrent.futures import Executor
+from typing import Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+from .parallel import resolve_workers, run_chunked
+from .schedule_engine import iter_amortize_batch
+from utils import round_math_array
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SENSITIVITY_METRICS = ('total_loan_cost', 'total_interest', 'last_month')
+
+
+class SensitivityGrid:
+    """Summary metrics indexed as [rate, term, overpayment value]."""
+
+    def __init__(self, principal: float,
+                 annual_rates: np.ndarray,
+                 terms: np.ndarray,
+                 overpayment_values: np.ndarray,
+                 is_constant_payment: bool,
+                 total_loan_cost: np.ndarray,
+                 total_interest: np.ndarray,
+                 last_month: np.ndarray):
+        self.principal = principal
+        self.annual_rates = annual_rates
+        self.terms = terms
+        self.overpayment_values = overpayment_values
+        self.is_constant_payment = is_constant_payment
+        self.total_loan_cost = total_loan_cost
+        self.total_interest = total_interest
+        self.last_month = last_month
+
+    def __repr__(self):
+        return (f'SensitivityGrid(principal={self.principal}, '
+                f'shape={self.total_loan_cost.shape}, '
+                f'is_constant_payment={self.is_constant_payment})')
+
+    def to_df(self, metric: str = 'total_loan_cost', overpayment_idx: int = 0) -> 'pd.DataFrame':
+        """One overpayment value as a rates x terms table, ready for a heatmap."""
+        import pandas as pd
+        if metric not in SENSITIVITY_METRICS:
+            raise ValueError(f'Unknown metric {metric}, expected one of {SENSITIVITY_METRICS}')
+        return pd.DataFrame(getattr(self, metric)[:, :, overpayment_idx],
+                            index=pd.Index(self.annual_rates, name='annual_rate'),
+                            columns=pd.Index(self.terms, name='months'))
+
+
+def sensitivity_grid(principal: float,
+                     annual_rates: Sequence[float],
+                     terms: Sequence[int],
+                     overpayment_values: Sequence[float],
+                     is_constant_payment: bool = False,
+                     max_workers: Optional[int] = 1,
+                     chunk_size: Optional[int] = None,
+                     executor: Optional[Executor] = None) -> SensitivityGrid:
+    """
+    Total cost, interest and payoff month for every (rate, term, overpayment value) combination, where the
+    overpayment is a FULL_TERM one of that value for the whole term and 0 means no overpayment.
+    All combinations run through the vectorized kernel together and only running totals are kept,
+    so memory grows with the number of scenarios, not with scenarios x months.
+    """
+    annual_rates = np.asarray(annual_rates, dtype=np.float64)
+    terms = np.asarray(terms, dtype=np.int64)
+    overpayment_values = np.asarray(overpayment_values, dtype=np.float64)
+    shape = (len(annual_rates), len(terms), len(overpayment_values))
+    rate, months, value = (axis.ravel() for axis in np.meshgrid(annual_rates, terms, overpayment_values,
+                                                                 indexing='ij'))
+    scenarios = np.column_stack((np.full(len(rate), float(principal)), rate, months, value,
+                                 np.full(len(rate), float(is_constant_payment))))
+
+    if executor is None and resolve_workers(max_workers) == 1:
+        parts = [_sensitivity_totals(scenarios)]
+    else:
+        parts = run_chunked(_sensitivity_totals, scenarios,
+                            max_workers=max_workers,
+                            chunk_size=chunk_size,
+                            executor=executor)
+    total_loan_cost, total_interest, last_month = (np.concatenate(part) for part in zip(*parts))
+    return SensitivityGrid(principal=principal,
+                           annual_rates=annual_rates,
+                           terms=terms,
+                           overpayment_values=overpayment_values,
+                           is_constant_payment=is_constant_payment,
+                           total_loan_cost=total_loan_cost.reshape(shape),
+                           total_interest=total_interest.reshape(shape),
+                           last_month=last_month.reshape(shape))
+
+
+def _sensitivity_totals(scenarios: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # scenarios columns: principal, annual_rate, months, overpayment value, is_constant_payment
+    principal, annual_rate, months, value, is_constant_payment = scenarios.T
+    months = months.astype(np.int64)
+    loan_amount = np.zeros(len(scenarios))
+    total_interest = np.zeros(len(scenarios))
+    last_month = np.zeros(len(scenarios), dtype=np.int64)
+    for m, lanes, _payment, interest, capital, overpayment, _payment_overpayment, new_balance in \
+            iter_amortize_batch(principal=principal,
+                                annual_rate=annual_rate,
+                                months=months,
+                                value=value,
+                                start=np.ones(len(scenarios), dtype=np.int64),
+                                end=np.where(value > 0, months, 0),
+                                is_constant_payment=is_constant_payment.astype(bool)):
+        if m == 1:
+            loan_amount[lanes] = capital + overpayment + new_balance
+        total_interest[lanes] += interest
+        last_month[lanes] = m
+    return (round_math_array(loan_amount + total_interest, 2),
+            round_math_array(total_interest, 2),
+            last_month)
@@ -1,8 +1,12 @@
 from typing import Optional, Callable
 import gettext
 
+from calculator.calculation import Result
 from calculator.loan_data import LoanData
 from calculator.overpayment import OverpaymentData
+from calculator.result_job import ResultJob
+from calculator.sensitivity import SensitivityGrid
+from dashboard.scenario_registry import ScenarioRegistry
 
 
 class AppState:
@@ -10,13 +14,26 @@ class AppState:
         self.language: str = 'en'
         self.loan_data: Optional[LoanData] = None
         self.custom_overpayments_set: list[OverpaymentData] = []
-        self.overpayments_set: list[OverpaymentData] = []
+        self.scenarios: ScenarioRegistry = ScenarioRegistry()
+        self.result: Optional[Result] = None
+        self.result_fingerprint: Optional[str] = None
+        self.job: Optional[ResultJob] = None
+        self.job_fingerprint: Optional[str] = None
+        self.export: Optional[tuple[tuple, bytes]] = None
         self.is_analysis_constant_overpayment: bool = False
         self.is_custom_overpayment: bool = False
         self.current_overpayment_name: Optional[str] = None
         self.translation: Callable[[str], str] = self.get_translation('en')
         self.calculate_schedule: bool = False
         self.clear_custom_overpayment_name: Optional[str] = None
+        self.is_sensitivity_analysis: bool = False
+        self.sensitivity_rates: list[float] = []
+        self.sensitivity_terms: list[int] = []
+        self.sensitivity_overpayments: list[float] = []
+        self.is_sensitivity_constant_payment: bool = False
+        self.sensitivity: Optional[tuple[tuple, SensitivityGrid]] = None
+        self.is_debug: bool = False
+        self.is_profiling: bool = False
 
     def set_language(self, lang_code: str):
         self.language = lang_code
@@ -39,10 +56,11 @@ class AppState:
         return {
             'language': self.language,
             'custom_overpayments_set': self.custom_overpayments_set,
-            'overpayments_set': self.overpayments_set,
+            'overpayments_set': self.scenarios.overpayments_set(),
             'is_analysis_constant_overpayment': self.is_analysis_constant_overpayment,
             'is_custom_overpayment': self.is_custom_overpayment,
             'current_overpayment_name': self.current_overpayment_name,
             'calculate_schedule': self.calculate_schedule,
-            'clear_custom_overpayment_name': self.clear_custom_overpayment_name
+            'clear_custom_overpayment_name': self.clear_custom_overpayment_name,
+            'is_sensitivity_analysis': self.is_sensitivity_analysis
         }
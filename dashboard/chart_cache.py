@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from typing import Optional
+
+from cachetools import LRUCache
+
+
+class ChartCache:
+    """Rendered charts (PNG bytes) by fingerprint, evicting the least recently used beyond `max_bytes` in total."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=len)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key: str):
+        with self._lock:
+            return key in self._cache
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._cache.get(key)
+            if png is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return png
+
+    def put(self, key: str, png: bytes):
+        with self._lock:
+            # A chart larger than the whole cache is not kept.
+            if len(png) <= self._cache.maxsize:
+                self._cache[key] = png
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'bytes': self._cache.currsize,
+                'max_bytes': self._cache.maxsize
+            }
+
+
+def fingerprint(*parts) -> str:
+    """Digest of strings, bytes and NumPy arrays (by dtype, shape and content), in order."""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif hasattr(part, 'tobytes'):
+            data = f'{part.dtype}{part.shape}'.encode() + part.tobytes()
+        else:
+            data = repr(part).encode()
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+chart_cache = ChartCache()
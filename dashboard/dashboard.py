@@ -1,15 +1,35 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import numpy_financial as npf
 import streamlit as st
 
-from calculator.calculation import calculate_result
+from calculator.cache import schedule_cache
+from calculator.calculation import Result, calculate_result
+from calculator.instrumentation import Profile, SpanRecorder, log_event, profiling, recording, span
+from calculator.result_job import ResultJob
+from dashboard.chart_cache import chart_cache
+from dashboard.result_export import display_export
+from dashboard.schedule_table import display_schedule_table
 from dashboard.sidebar import display_sidebar
 from calculator.loan_data import LoanData, LoanSummary
-from dashboard.plot_generator import plot_remaining_balance, plot_total_loan_cost, plot_loan_duration
+from calculator.overpayment import OverpaymentData
+from calculator.sensitivity import SensitivityGrid, sensitivity_grid
+from dashboard.plot_generator import plot_remaining_balance, plot_total_loan_cost, plot_loan_duration, \
+    plot_sensitivity_heatmap
 from utils import round_math
 from . import app_state
 
 state = app_state
 
+# Shared by all sessions; threads rather than processes so every job fills the same schedule cache.
+result_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='result-job')
+# A job that finishes within this many seconds is shown at once, without a progress bar.
+JOB_WAIT_SECONDS = 0.3
+JOB_POLL_SECONDS = 0.5
+
 
 def display_summary(summary: LoanSummary):
     _ = state.translation
@@ -54,26 +74,103 @@ def display_loan_details():
     st.write(f'{initial_monthly_payment_text}{round_math(initial_payment, 2)} PLN')
 
 
+def get_overpayments_set(no_overpayment_name: str) -> list[OverpaymentData]:
+    custom_overpayments = state.custom_overpayments_set if state.is_custom_overpayment else []
+    if state.scenarios.sync('custom', custom_overpayments):
+        log_event(logging.DEBUG, 'custom_overpayments', overpayment_sets=[data.name for data in custom_overpayments])
+    return state.scenarios.overpayments_set(reserved=(no_overpayment_name,))
+
+
+def get_result(no_overpayment_name: str) -> Result:
+    """
+    The result of the current inputs, or the scenarios finished so far while its job runs (state.job is set).
+    Reruns triggered by unrelated widgets (table paging, debug options, ...) reuse the result or keep polling the
+    running job instead of restarting the calculation.
+    """
+    overpayments_set = get_overpayments_set(no_overpayment_name)
+    result_fingerprint = state.scenarios.fingerprint(state.loan_data, no_overpayment_name)
+    if state.result is not None and state.result_fingerprint == result_fingerprint:
+        log_event(logging.DEBUG, 'result_reused', scenarios=len(state.result.summarises))
+        return state.result
+
+    if state.job is None or state.job_fingerprint != result_fingerprint:
+        if state.job is not None:
+            state.job.cancel()
+        state.job = ResultJob(loan_data=state.loan_data,
+                              overpayments_set=overpayments_set,
+                              executor=result_executor,
+                              no_overpayment_name=no_overpayment_name)
+        state.job_fingerprint = result_fingerprint
+    if not state.job.wait(JOB_WAIT_SECONDS):
+        return state.job.partial_result()
+
+    state.result = state.job.result()
+    state.result_fingerprint = result_fingerprint
+    state.job = None
+    state.job_fingerprint = None
+    return state.result
+
+
 def display_calculation():
     _ = state.translation
-    result = calculate_result()
+    result = get_result(no_overpayment_name=_('No overpayment'))
     loan_summary_text = _('Loan Summary: ')
-    repayment_schedule_text = _('Repayment Schedule for ')
     diagrams_text = _('Diagrams for comparison')
+    if state.job is not None:
+        done, total = state.job.progress()
+        st.progress(done / total, text=f'{_("Calculating scenarios: ")}{done} / {total}')
     for key, summary in result.summarises.items():
         st.subheader(f'{loan_summary_text}"{key}"')
         display_summary(summary=summary)
 
-    for key, schedule in result.schedules.items():
-        st.subheader(f'{repayment_schedule_text}"{key}"')
-        st.dataframe(schedule)
+    display_schedule_table(result.schedules)
+    if state.job is not None:
+        # The export and the charts compare every scenario, so they wait for the whole result.
+        return
+    display_export(result)
 
     if result.schedules:
         st.subheader(diagrams_text)
 
-        plot_remaining_balance(result.schedules)
-        plot_total_loan_cost(result.schedules)
-        plot_loan_duration(result.schedules)
+        with span('plotting', chart='remaining_balance'):
+            plot_remaining_balance(result.schedules)
+        with span('plotting', chart='total_loan_cost'):
+            plot_total_loan_cost(result.summarises)
+        with span('plotting', chart='loan_duration'):
+            plot_loan_duration(result.summarises)
+
+
+def get_sensitivity_grid() -> SensitivityGrid:
+    # Reruns for the metric radio, table paging or a job poll reuse the grid of unchanged inputs.
+    grid_key = (state.loan_data.loan_amount, tuple(state.sensitivity_rates), tuple(state.sensitivity_terms),
+                tuple(state.sensitivity_overpayments), state.is_sensitivity_constant_payment)
+    if state.sensitivity is None or state.sensitivity[0] != grid_key:
+        with span('engine', scenario='sensitivity', path='sensitivity_grid'):
+            grid = sensitivity_grid(principal=state.loan_data.loan_amount,
+                                    annual_rates=state.sensitivity_rates,
+                                    terms=state.sensitivity_terms,
+                                    overpayment_values=state.sensitivity_overpayments,
+                                    is_constant_payment=state.is_sensitivity_constant_payment)
+        state.sensitivity = (grid_key, grid)
+    return state.sensitivity[1]
+
+
+def display_sensitivity():
+    _ = state.translation
+    st.subheader(_('Sensitivity analysis'))
+    grid = get_sensitivity_grid()
+    metrics = {
+        _('Total loan cost'): 'total_loan_cost',
+        _('Total interest: '): 'total_interest',
+        _('Last month: '): 'last_month'
+    }
+    metric_label = st.radio(_('Metric'), list(metrics), horizontal=True)
+    overpayment_value = st.select_slider(_('Const overpayment (PLN)'), options=state.sensitivity_overpayments)
+    with span('plotting', chart='sensitivity_heatmap'):
+        plot_sensitivity_heatmap(grid=grid,
+                                 metric=metrics[metric_label],
+                                 overpayment_idx=state.sensitivity_overpayments.index(overpayment_value),
+                                 title=f'{metric_label} ({overpayment_value} PLN)')
 
 
 def display_details():
@@ -91,14 +188,39 @@ def display_details():
     st.write(f'{init_payment}{initial_payment_value} PLN')
 
 
+def display_debug(recorder: SpanRecorder, profile: Optional[Profile]):
+    _ = state.translation
+    with st.expander(_('Debug'), expanded=True):
+        st.write(_('Time by phase (ms)'))
+        st.dataframe({phase: [round(seconds * 1000, 3)] for phase, seconds in recorder.totals().items()},
+                     hide_index=True)
+        st.write(_('Time by scenario'))
+        st.dataframe(recorder.to_df(), hide_index=True)
+        st.write(_('Schedule cache'))
+        st.json(schedule_cache.stats())
+        st.write(_('Chart cache'))
+        st.json(chart_cache.stats())
+        if profile is not None:
+            st.code(profile.stats(), language='text')
+
+
 def display_dashboard():
     display_sidebar()
     _ = state.translation
     st.header(_('Mortgage Calculator with Overpayments'))
     if state.calculate_schedule:
-        print(f'State language = {state.language}')
-        display_details()
-        display_calculation()
+        log_event(logging.DEBUG, 'dashboard_calculation', language=state.language)
+        with recording() as recorder, profiling(state.is_profiling) as profile:
+            display_details()
+            display_calculation()
+            if state.is_sensitivity_analysis:
+                display_sensitivity()
+        if state.is_debug:
+            display_debug(recorder, profile)
+        if state.job is not None:
+            # Poll the running job; any widget interaction meanwhile starts a rerun that picks the job up again.
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
 
 
 if __name__ == '__main__':
@@ -1,31 +1,83 @@
+import io
+from typing import Callable
+
 import matplotlib.pyplot as plt
 import seaborn as sns
 import streamlit as st
+from matplotlib.figure import Figure
 
-from calculator.calculation import summarize_loan
+from calculator.loan_data import LoanSummary
+from calculator.sensitivity import SensitivityGrid
 from dashboard import app_state
+from dashboard.chart_cache import chart_cache, fingerprint
 
 state = app_state
-_ = state.translation
+
+# st.pyplot renders at 200 dpi, but st.image(..., use_container_width=True) scales every image wider than 1460 px
+# (2 * 730, Streamlit's maximum content width) down and re-encodes it on each call. Rendering at most that wide lets
+# the cached bytes through unchanged.
+SAVEFIG_OPTIONS = {'bbox_inches': 'tight', 'format': 'png'}
+MAX_DPI = 200
+MAX_IMAGE_WIDTH = 1460
+
+
+def figure_png(fig: Figure) -> bytes:
+    image = io.BytesIO()
+    fig.savefig(image, dpi=min(MAX_DPI, MAX_IMAGE_WIDTH // fig.get_figwidth()), **SAVEFIG_OPTIONS)
+    return image.getvalue()
+
+
+def render_chart(key: str, draw: Callable[[], Figure]):
+    """
+    Shows the chart cached under `key`, drawing and rasterizing it only on a miss. The key must cover everything
+    `draw` depends on, including the language of the labels.
+    """
+    png = chart_cache.get(key)
+    if png is None:
+        fig = draw()
+        try:
+            png = figure_png(fig)
+        finally:
+            plt.close(fig)
+        chart_cache.put(key, png)
+    st.image(png, use_container_width=True)
+
+
+def summaries_fingerprint(summaries: dict[str, LoanSummary]) -> tuple:
+    return tuple((label, summary.loan_amount, summary.total_interest, summary.total_loan_cost, summary.last_month)
+                 for label, summary in summaries.items())
+
 
 def plot_remaining_balance(schedules: dict):
-    plt.figure(figsize=(10, 6))
+    key = fingerprint('remaining_balance', state.language,
+                      *(part for label, df in schedules.items()
+                        for part in (label, df['month'].to_numpy(), df['remaining_balance'].to_numpy())))
+    render_chart(key, lambda: draw_remaining_balance(schedules))
+
+
+def draw_remaining_balance(schedules: dict) -> Figure:
+    _ = state.translation
+    fig, ax = plt.subplots(figsize=(10, 6))
     for label, df in schedules.items():
-        plt.plot(df['month'], df['remaining_balance'], label=label)
-    plt.xlabel(_('Month'))
-    plt.ylabel(_('Remaining saldo'))
-    plt.title(_('Loan Balance Over Time'))
-    plt.legend()
-    plt.grid(True)
-    st.pyplot(plt)
-    plt.clf()
+        ax.plot(df['month'], df['remaining_balance'], label=label)
+    ax.set_xlabel(_('Month'))
+    ax.set_ylabel(_('Remaining saldo'))
+    ax.set_title(_('Loan Balance Over Time'))
+    ax.legend()
+    ax.grid(True)
+    return fig
 
 
-def plot_total_loan_cost(schedules: dict):
+def plot_total_loan_cost(summaries: dict[str, LoanSummary]):
+    key = fingerprint('total_loan_cost', state.language, summaries_fingerprint(summaries))
+    render_chart(key, lambda: draw_total_loan_cost(summaries))
+
+
+def draw_total_loan_cost(summaries: dict[str, LoanSummary]) -> Figure:
+    _ = state.translation
     labels = []
     costs = []
-    for label, df in schedules.items():
-        summary= summarize_loan(df)
+    for label, summary in summaries.items():
         labels.append(label)
         costs.append(summary.total_loan_cost)
 
@@ -37,17 +89,21 @@ def plot_total_loan_cost(schedules: dict):
     ax.set_xticklabels(labels, rotation=90)
     for i, val in enumerate(costs):
         ax.text(i, val + 1000, f"{val:,.0f}", ha='center', fontsize=10)
-    st.pyplot(fig)
-    plt.clf()
+    return fig
+
+
+def plot_loan_duration(summaries: dict[str, LoanSummary]):
+    key = fingerprint('loan_duration', state.language, summaries_fingerprint(summaries))
+    render_chart(key, lambda: draw_loan_duration(summaries))
 
 
-def plot_loan_duration(schedules: dict):
+def draw_loan_duration(summaries: dict[str, LoanSummary]) -> Figure:
+    _ = state.translation
     labels = []
     durations = []
     formatted_labels = []
 
-    for label, df in schedules.items():
-        summary = summarize_loan(df)
+    for label, summary in summaries.items():
         months = summary.last_month
         labels.append(label)
         durations.append(months)
@@ -63,5 +119,22 @@ def plot_loan_duration(schedules: dict):
     ax.set_xticklabels(labels, rotation=90)
     for i, val in enumerate(formatted_labels):
         ax.text(i, durations[i] + 1, val, ha='center', fontsize=5)
-    st.pyplot(fig)
-    plt.clf()
+    return fig
+
+
+def plot_sensitivity_heatmap(grid: SensitivityGrid, metric: str, overpayment_idx: int, title: str):
+    key = fingerprint('sensitivity_heatmap', state.language, title, grid.annual_rates, grid.terms,
+                      getattr(grid, metric)[:, :, overpayment_idx])
+    render_chart(key, lambda: draw_sensitivity_heatmap(grid, metric, overpayment_idx, title))
+
+
+def draw_sensitivity_heatmap(grid: SensitivityGrid, metric: str, overpayment_idx: int, title: str) -> Figure:
+    _ = state.translation
+    df = grid.to_df(metric=metric, overpayment_idx=overpayment_idx)
+    df.index = [f'{rate * 100:.2f}%' for rate in df.index]
+    fig, ax = plt.subplots(figsize=(10, 8))
+    sns.heatmap(df, ax=ax, cmap='viridis', annot=df.size <= 150, fmt='.0f')
+    ax.set_title(title)
+    ax.set_xlabel(_('Loan Term (months)'))
+    ax.set_ylabel(_('Annual rate: '))
+    return fig
@@ -0,0 +1,29 @@
+import streamlit as st
+
+from calculator.calculation import Result
+from calculator.export import ARROW, CSV, EXPORT_FORMATS, PARQUET, export_result
+from calculator.instrumentation import span
+from dashboard import app_state
+
+state = app_state
+
+FORMAT_LABELS = {PARQUET: 'Parquet', ARROW: 'Arrow IPC', CSV: 'CSV (zip)'}
+FILE_NAMES = {PARQUET: 'loan_schedules.parquet', ARROW: 'loan_schedules.arrows', CSV: 'loan_schedules.zip'}
+MIME_TYPES = {PARQUET: 'application/vnd.apache.parquet', ARROW: 'application/vnd.apache.arrow.stream',
+              CSV: 'application/zip'}
+
+
+def display_export(result: Result):
+    """
+    Download of every schedule and summary in the chosen format. The file is built once per result and format
+    (st.download_button needs the bytes up front), not on every rerun.
+    """
+    _ = state.translation
+    export_format = st.selectbox(_('Export format'), EXPORT_FORMATS, format_func=FORMAT_LABELS.get,
+                                 key='export_format')
+    export_key = (state.result_fingerprint, export_format)
+    if state.export is None or state.export[0] != export_key:
+        with span('export', format=export_format, scenarios=len(result.schedules)):
+            state.export = (export_key, export_result(result, export_format))
+    st.download_button(_('Download schedules and summaries'), data=state.export[1],
+                       file_name=FILE_NAMES[export_format], mime=MIME_TYPES[export_format])
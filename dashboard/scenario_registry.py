@@ -0,0 +1,97 @@
+import hashlib
+from dataclasses import replace
+from typing import Optional
+
+from calculator.loan_data import LoanData
+from calculator.overpayment import OverpaymentData
+
+
+def scenario_hash(overpayment_data: OverpaymentData) -> str:
+    return hashlib.sha256(repr(overpayment_data.canonical()).encode()).hexdigest()
+
+
+class ScenarioEntry:
+    def __init__(self, scenario_id: str, overpayment_data: OverpaymentData, content_hash: str):
+        self.scenario_id = scenario_id
+        self.overpayment_data = overpayment_data
+        self.content_hash = content_hash
+
+    def __repr__(self):
+        return (f'ScenarioEntry(scenario_id={self.scenario_id}, '
+                f'name={self.overpayment_data.name}, '
+                f'content_hash={self.content_hash[:12]})')
+
+
+class ScenarioRegistry:
+    """
+    The overpayment sets compared on the dashboard, one entry per stable id such as 'prepayment/constant_value'
+    or 'custom/<name>'. Registering an id again replaces its entry, and only if the content changed, so reruns
+    neither duplicate scenarios nor change the fingerprint of unchanged ones.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, ScenarioEntry] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, scenario_id: str):
+        return scenario_id in self._entries
+
+    def __repr__(self):
+        return f'ScenarioRegistry(ids={list(self._entries)})'
+
+    def get(self, scenario_id: str) -> Optional[ScenarioEntry]:
+        return self._entries.get(scenario_id)
+
+    def register(self, scenario_id: str, overpayment_data: OverpaymentData) -> bool:
+        """Stores `overpayment_data` under `scenario_id`; returns whether anything changed."""
+        content_hash = scenario_hash(overpayment_data)
+        entry = self._entries.get(scenario_id)
+        if entry is not None and entry.content_hash == content_hash:
+            return False
+        self._entries[scenario_id] = ScenarioEntry(scenario_id, overpayment_data, content_hash)
+        return True
+
+    def remove(self, scenario_id: str) -> bool:
+        return self._entries.pop(scenario_id, None) is not None
+
+    def sync(self, prefix: str, overpayments_set: list[OverpaymentData]) -> bool:
+        """Makes the entries under `prefix/` exactly `overpayments_set`, one per name; returns whether any changed."""
+        ids = [f'{prefix}/{overpayment_data.name}' for overpayment_data in overpayments_set]
+        changed = [self.register(scenario_id, overpayment_data)
+                   for scenario_id, overpayment_data in zip(ids, overpayments_set)]
+        stale = [scenario_id for scenario_id in self._entries
+                 if scenario_id.startswith(f'{prefix}/') and scenario_id not in ids]
+        for scenario_id in stale:
+            self.remove(scenario_id)
+        return any(changed) or bool(stale)
+
+    def overpayments_set(self, reserved: tuple[str, ...] = ()) -> list[OverpaymentData]:
+        """
+        Results are keyed by scenario name, so a name registered under several ids with the same content is
+        calculated once, and one held by different content, or `reserved` for another scenario (e.g. the one
+        without overpayments), gets the prefix of its id, e.g. 'Monthly (custom)'.
+        """
+        hashes = dict.fromkeys(reserved)
+        overpayments_set = []
+        for entry in self._entries.values():
+            overpayment_data = entry.overpayment_data
+            if hashes.get(overpayment_data.name) == entry.content_hash:
+                continue
+            if overpayment_data.name in hashes:
+                prefix = entry.scenario_id.rsplit('/', 1)[0]
+                name = f'{overpayment_data.name} ({prefix})'
+                if name in hashes:
+                    name = f'{overpayment_data.name} ({entry.scenario_id})'
+                overpayment_data = replace(overpayment_data, name=name)
+            hashes[overpayment_data.name] = entry.content_hash
+            overpayments_set.append(overpayment_data)
+        return overpayments_set
+
+    def fingerprint(self, loan_data: LoanData, no_overpayment_name: str) -> str:
+        """Identifies the inputs of calculate_result, so an unchanged result can be reused."""
+        canonical = (loan_data.canonical(), no_overpayment_name,
+                     tuple(scenario_hash(overpayment_data)
+                           for overpayment_data in self.overpayments_set(reserved=(no_overpayment_name,))))
+        return hashlib.sha256(repr(canonical).encode()).hexdigest()
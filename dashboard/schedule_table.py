@@ -0,0 +1,56 @@
+import math
+from typing import Optional
+
+import pandas as pd
+import streamlit as st
+
+from calculator.instrumentation import span
+from calculator.loan_schedule import SCHEDULE_COLUMNS
+from dashboard import app_state
+
+state = app_state
+
+PAGE_SIZES = [12, 24, 60, 120, 360]
+DEFAULT_PAGE_SIZE = 24
+
+
+def page_count(rows: int, page_size: int) -> int:
+    return max(1, math.ceil(rows / page_size))
+
+
+def schedule_page(schedule: pd.DataFrame, page: int, page_size: int,
+                  columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """Rows of the 1-based `page`, with the month and the chosen `columns` in schedule order."""
+    page = min(max(1, page), page_count(len(schedule), page_size))
+    visible = ['month'] + [column for column in SCHEDULE_COLUMNS[1:] if columns is None or column in columns]
+    start = (page - 1) * page_size
+    return schedule.iloc[start:start + page_size][visible]
+
+
+def display_schedule_table(schedules: dict[str, pd.DataFrame]):
+    """
+    One schedule at a time: only the selected scenario's current page and columns are sent to the browser,
+    so the payload does not grow with the number of scenarios or the loan term.
+    """
+    _ = state.translation
+    if not schedules:
+        return
+    repayment_schedule_text = _('Repayment Schedule for ')
+    name = st.selectbox(_('Scenario'), list(schedules), key='schedule_scenario')
+    schedule = schedules[name]
+    columns = st.multiselect(_('Columns'), SCHEDULE_COLUMNS[1:], default=SCHEDULE_COLUMNS[1:],
+                             key='schedule_columns')
+    page_size = st.selectbox(_('Rows per page'), PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                             key='schedule_page_size')
+    pages = page_count(len(schedule), page_size)
+    # The page range depends on the scenario and page size, so each combination keeps its own page.
+    page = st.number_input(_('Page'), min_value=1, max_value=pages, value=1, step=1,
+                           key=f'schedule_page_{name}_{page_size}')
+
+    st.subheader(f'{repayment_schedule_text}"{name}"')
+    rows = schedule_page(schedule, page, page_size, columns)
+    with span('rendering', scenario=name, rows=len(rows), columns=len(rows.columns)):
+        st.dataframe(rows, hide_index=True)
+    if len(rows):
+        st.caption(f'{_("Month")} {rows["month"].iloc[0]}–{rows["month"].iloc[-1]} / {len(schedule)} '
+                   f'({_("Page")} {page} / {pages})')
@@ -1,12 +1,20 @@
+import logging
+
 from dashboard import app_state
+from calculator.goal_seek import GoalType, solve_overpayment
+from calculator.instrumentation import log_event
 from calculator.loan_data import LoanData
 from calculator.overpayment import Overpayment, OverpaymentType, OverpaymentData
+import numpy as np
 import streamlit as st
 
 from utils import language_labels
 
 state = app_state
 
+# The grid is computed in the script thread, so its size is capped to keep the session responsive (about 0.3 s).
+MAX_SENSITIVITY_SCENARIOS = 20_000
+
 
 def get_language_option():
     _ = state.translation
@@ -94,13 +102,12 @@ def generate_custom_overpayment():
 
     if overpayment is not None:
         if st.sidebar.button(_('Add')):
-            print(f'Button "add" has been clicked')
             for idx, overpayment_data in enumerate(state.custom_overpayments_set):
                 if overpayment_data.name == overpayment_name:
-                    print(f'Adding {overpayment} to {overpayment_data.name}, idx ={idx}')
-                    overpayment_data.add_overpayment(overpayment)
+                    log_event(logging.DEBUG, 'overpayment_added', overpayment=str(overpayment),
+                              overpayment_set=overpayment_data.name, idx=idx)
+                    state.custom_overpayments_set[idx] = overpayment_data.add_overpayment(overpayment)
                     break
-        print(f'Custom overpayment set: {state.custom_overpayments_set}')
     else:
         st.warning('No overpayment details to add.')
 
@@ -132,16 +139,14 @@ def add_custom_overpayments():
         overpayment_data = OverpaymentData(name=custom_overpayment_name,
                                            overpayments=[])
         if custom_overpayments_set:
-            print(f'Custom overpayment {custom_overpayment_name}')
             state.custom_overpayments_set.append(overpayment_data)
         else:
             state.custom_overpayments_set = [overpayment_data]
         state.current_overpayment_name = custom_overpayment_name
-        print(f'New custom overpayment has been added: {custom_overpayment_name}')
+        log_event(logging.DEBUG, 'overpayment_set_added', overpayment_set=custom_overpayment_name)
         generate_custom_overpayment()
     elif chosen_overpayment_set:
         state.current_overpayment_name = chosen_overpayment_set
-        print(f'{chosen_overpayment_set} has been chosen')
         generate_custom_overpayment()
 
 
@@ -157,9 +162,10 @@ def display_overpayment(overpayment: Overpayment, overpayment_idx: int, overpaym
                         f'{overpayment.start_month} - {overpayment.end_month}, '
                         f'{overpayment.value} PLN, {overpayment.is_constant_payment}')
     if st.sidebar.button(_(f'Remove'), key=f'remove_overpayment_{overpayment_idx}_for_{overpayment_data_idx}'):
-        print(f'Overpayment {overpayment} will be removed from {overpayment_data_idx}')
-        state.custom_overpayments_set[overpayment_data_idx].overpayments.pop(overpayment_idx)
-        print(f'Custom overpayment set: {state.custom_overpayments_set}')
+        log_event(logging.DEBUG, 'overpayment_removed', overpayment=str(overpayment),
+                  overpayment_set=state.custom_overpayments_set[overpayment_data_idx].name)
+        state.custom_overpayments_set[overpayment_data_idx] = \
+            state.custom_overpayments_set[overpayment_data_idx].remove_overpayment(overpayment_idx)
         st.rerun()
 
 
@@ -168,9 +174,8 @@ def display_overpayment_set(overpayment_set: OverpaymentData, overpayment_data_i
     overpayment_set_header = _('Overpayment set: ')
     st.sidebar.write(f'{overpayment_set_header}**{overpayment_set.name}**')
     if st.sidebar.button(_(f'Remove'), key=f'remove_overpayment_data_{overpayment_data_idx}'):
-        print(f'Overpayment set {overpayment_data_idx}, name {overpayment_set.name} has been removed')
+        log_event(logging.DEBUG, 'overpayment_set_removed', overpayment_set=overpayment_set.name)
         state.custom_overpayments_set.pop(overpayment_data_idx)
-        print(f'Custom overpayment set: {state.custom_overpayments_set}')
         if state.custom_overpayments_set:
             state.current_overpayment_name = state.custom_overpayments_set[0].name
         else:
@@ -199,7 +204,38 @@ def get_loan_parameters():
 
     state.loan_data = LoanData(loan_amount=loan_amount,
                                loan_annual_rate=annual_rate,
-                               months=months)
+                               months=months,
+                               rate_changes=get_rate_changes(annual_rate=annual_rate, months=months))
+
+
+def get_rate_changes(annual_rate: float, months: int) -> dict[int, float]:
+    _ = state.translation
+    if not st.sidebar.toggle(_('Interest rate changes'), value=False):
+        return {}
+    month_column = _('From month')
+    rate_column = _('Annual Interest Rate (%)')
+    changes = st.sidebar.data_editor(
+        {month_column: [min(61, months)], rate_column: [round(annual_rate * 100 + 1, 2)]},
+        num_rows='dynamic',
+        column_config={
+            month_column: st.column_config.NumberColumn(min_value=1, max_value=months, step=1),
+            rate_column: st.column_config.NumberColumn(min_value=0.0, max_value=30.0, step=0.01)
+        },
+        key='rate_changes')
+    rate_changes = {}
+    ignored = []
+    for month, rate in zip(changes[month_column], changes[rate_column]):
+        if month is None or rate is None:
+            continue
+        # Rows entered for a longer term stay in the editor after the term is shortened.
+        if 1 <= int(month) <= months:
+            rate_changes[int(month)] = rate / 100
+        else:
+            ignored.append(int(month))
+    if ignored:
+        ignored_text = _('Rate changes outside the loan term are ignored, months: ')
+        st.sidebar.warning(f'{ignored_text}{", ".join(str(month) for month in ignored)}')
+    return rate_changes
 
 
 def is_include_prepayment():
@@ -220,15 +256,15 @@ def is_include_prepayment():
                                                       end_month=state.loan_data.months,
                                                       value=analysis_overpayment_value,
                                                       is_constant_payment=True)
-        state.overpayments_set.append(
-            OverpaymentData(name=_('Overpayment with constant overpayment value'),
-                            overpayments=[constant_overpayment_by_value]))
-        state.overpayments_set.append(
-            OverpaymentData(name=_('Overpayment with constant monthly payment value'),
-                            overpayments=[constant_overpayment_by_payment]))
+        state.scenarios.register('prepayment/constant_value',
+                                 OverpaymentData(name=_('Overpayment with constant overpayment value'),
+                                                 overpayments=[constant_overpayment_by_value]))
+        state.scenarios.register('prepayment/constant_payment',
+                                 OverpaymentData(name=_('Overpayment with constant monthly payment value'),
+                                                 overpayments=[constant_overpayment_by_payment]))
     else:
         state.is_analysis_constant_overpayment = False
-        state.overpayments_set = []
+        state.scenarios.sync('prepayment', [])
 
 
 def is_include_custom_overpayment():
@@ -247,11 +283,82 @@ def is_include_custom_overpayment():
         display_custom_overpayment_set()
 
 
+def goal_seek():
+    _ = state.translation
+    if not st.sidebar.toggle(_('Find overpayment for a goal'), value=False):
+        return
+
+    loan_data = state.loan_data
+    goals = {
+        _('Pay off by month'): GoalType.PAYOFF_MONTH,
+        _('Total interest at most (PLN)'): GoalType.TOTAL_INTEREST,
+        _('Monthly payment with overpayment at most (PLN)'): GoalType.MONTHLY_OUTLAY
+    }
+    goal_label = st.sidebar.selectbox(_('Goal'), list(goals))
+    goal_type = goals[goal_label]
+    if goal_type == GoalType.PAYOFF_MONTH:
+        target = st.sidebar.number_input(goal_label, min_value=1, max_value=loan_data.months,
+                                         value=max(1, loan_data.months // 2))
+    else:
+        target = st.sidebar.number_input(goal_label, min_value=0.0, value=round(loan_data.loan_amount / 2, 2)
+                                         if goal_type == GoalType.TOTAL_INTEREST else 5000.0)
+    is_constant_payment = st.sidebar.checkbox(_('Keep Fixed Payment for Entire Loan Term'), key='goal_seek_constant')
+
+    if st.sidebar.button(_('Find overpayment')):
+        result = solve_overpayment(loan_data=loan_data,
+                                   goal_type=goal_type,
+                                   target=target,
+                                   is_constant_payment=is_constant_payment)
+        if result.is_reachable:
+            st.sidebar.success(f'{_("Monthly overpayment: ")}{result.value} PLN\n\n'
+                               f'{_("Last month: ")}{result.summary.last_month}\n\n'
+                               f'{_("Total interest: ")}{result.summary.total_interest} PLN')
+        else:
+            st.sidebar.warning(_('This goal cannot be reached with a monthly overpayment.'))
+
+
+def sensitivity_analysis():
+    _ = state.translation
+    state.is_sensitivity_analysis = st.sidebar.toggle(_('Sensitivity analysis'), value=False)
+    if not state.is_sensitivity_analysis:
+        return
+
+    min_rate, max_rate = st.sidebar.slider(_('Annual Interest Rate range (%)'), min_value=0.1, max_value=30.0,
+                                           value=(2.0, 12.0), step=0.1)
+    rate_steps = st.sidebar.number_input(_('Number of rates'), min_value=2, max_value=100, value=21)
+    min_term, max_term = st.sidebar.slider(_('Loan Term range (months)'), min_value=12, max_value=360,
+                                           value=(120, 360), step=12)
+    term_steps = st.sidebar.number_input(_('Number of terms'), min_value=2, max_value=60, value=11)
+    max_overpayment = st.sidebar.number_input(_('Maximum const overpayment (PLN)'), min_value=0.0, value=2000.0)
+    overpayment_steps = st.sidebar.number_input(_('Number of overpayment values'), min_value=1, max_value=50, value=5)
+    state.is_sensitivity_constant_payment = st.sidebar.checkbox(_('Keep Fixed Payment for Entire Loan Term'),
+                                                                key='sensitivity_constant')
+
+    state.sensitivity_rates = np.round(np.linspace(min_rate, max_rate, rate_steps) / 100, 6).tolist()
+    state.sensitivity_terms = np.unique(np.linspace(min_term, max_term, term_steps).astype(int)).tolist()
+    state.sensitivity_overpayments = np.round(np.linspace(0.0, max_overpayment, overpayment_steps), 2).tolist()
+
+    scenarios = len(state.sensitivity_rates) * len(state.sensitivity_terms) * len(state.sensitivity_overpayments)
+    if scenarios > MAX_SENSITIVITY_SCENARIOS:
+        too_many_text = _('Too many sensitivity scenarios, reduce the number of steps: ')
+        st.sidebar.error(f'{too_many_text}{scenarios} > {MAX_SENSITIVITY_SCENARIOS}')
+        state.is_sensitivity_analysis = False
+
+
+def debug_options():
+    _ = state.translation
+    state.is_debug = st.sidebar.toggle(_('Debug'), value=False)
+    state.is_profiling = state.is_debug and st.sidebar.checkbox(_('Profile calculation'), key='profile_calculation')
+
+
 def display_sidebar():
     get_language_option()
     get_loan_parameters()
     is_include_prepayment()
     is_include_custom_overpayment()
+    goal_seek()
+    sensitivity_analysis()
+    debug_options()
     _ = state.translation
     if st.sidebar.button(_('Calculate Loan Schedule')):
         state.calculate_schedule = True
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Optional
+
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+DEFAULT_URL = 'http://127.0.0.1:8888'
+LOAN_DATA = {'loan_amount': 450000.0, 'loan_annual_rate': 0.0658, 'months': 360}
+MONTHLY = [{'type': 'FULL_TERM', 'start': 1, 'end': 360, 'value': 500.0}]
+ONE_TIME = [{'type': 'ONE_TIME', 'start': 12 * year, 'value': 20000.0, 'is_constant_payment': True}
+            for year in range(1, 6)]
+PAYLOADS = {
+    'schedule': {'loan_data': LOAN_DATA, 'overpayments': ONE_TIME},
+    'summary': {'loan_data': LOAN_DATA, 'overpayments': ONE_TIME},
+    'compare': {'loan_data': LOAN_DATA, 'overpayments_set': [{'name': 'Monthly', 'overpayments': MONTHLY},
+                                                             {'name': 'One-time', 'overpayments': ONE_TIME}]}
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def load(url: str, body: bytes, requests: int, concurrency: int, timeout: float) -> dict:
+    """
+    Sends `requests` POSTs from `concurrency` clients, each waiting for its response before the next request.
+    Throughput and latencies count successful responses only; the rest (e.g. 503 when the pool is full, 0 for
+    connection errors) are reported by status.
+    """
+    client = AsyncHTTPClient(max_clients=concurrency)
+    latencies = []
+    statuses = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.fetch(url, method='POST', body=body, request_timeout=timeout,
+                                              headers={'Content-Type': 'application/json'})
+                code = response.code
+            except HTTPClientError as e:
+                code = e.code
+            except OSError:
+                code = 0
+            if 200 <= code < 300:
+                latencies.append(time.perf_counter() - start)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    client.close()
+    if not latencies:
+        return {'requests': requests, 'concurrency': concurrency, 'seconds': round(seconds, 3), 'throughput': 0.0,
+                'statuses': statuses, 'ms': None}
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 1),
+        'statuses': statuses,
+        'ms': {'mean': round(statistics.fmean(latencies) * 1000, 2),
+               'p50': round(percentile(latencies, 0.50) * 1000, 2),
+               'p90': round(percentile(latencies, 0.90) * 1000, 2),
+               'p99': round(percentile(latencies, 0.99) * 1000, 2),
+               'max': round(max(latencies) * 1000, 2)}
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Measure throughput and latency of a running api.py.')
+    parser.add_argument('--url', default=DEFAULT_URL, help='base URL of the API')
+    parser.add_argument('--endpoint', choices=sorted(PAYLOADS), default='summary')
+    parser.add_argument('--payload', help='JSON file sent instead of the built-in example payload')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=20, help='requests sent before measuring')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds per request')
+    args = parser.parse_args(argv)
+
+    if args.payload:
+        with open(args.payload, 'rb') as f:
+            body = f.read()
+    else:
+        body = json.dumps(PAYLOADS[args.endpoint]).encode()
+    url = f'{args.url.rstrip("/")}/{args.endpoint}'
+
+    async def run() -> dict:
+        if args.warmup:
+            await load(url, body, args.warmup, min(args.concurrency, args.warmup), args.timeout)
+        return await load(url, body, args.requests, args.concurrency, args.timeout)
+
+    report = asyncio.run(run())
+    print(json.dumps({'url': url, **report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
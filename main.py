@@ -1,4 +1,6 @@
+from calculator.instrumentation import configure_logging
 from dashboard.dashboard import display_dashboard
 
 if __name__ == '__main__':
+    configure_logging()
     display_dashboard()
\ No newline at end of file
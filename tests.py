@@ -1,7 +1,44 @@
+import asyncio
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import FrozenInstanceError, asdict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
 
-from calculator.calculation import generate_schedule
-from calculator.overpayment import Overpayment, OverpaymentType, overpayments_to_df
+from api import make_app, make_pool
+from batch import run_batch
+from benchmark import collect_benchmarks, compare, run_benchmarks
+from calculator.cache import ScheduleCache, schedule_cache
+from calculator.calculation import BATCH_KERNEL_MIN_LANES, calculate_result, cached_schedules, generate_schedule, \
+    generate_schedule_batch, iter_schedule, schedule_totals, summarize_loan, summarize_schedule
+from calculator.export import EXPORT_FORMATS, export_result, read_export
+from calculator.goal_seek import GoalType, goal_overpayment, is_goal_met, solve_overpayment
+from calculator.instrumentation import configure_logging, logger, profiling, recording
+from calculator.loan_data import LoanData
+from calculator.loan_schedule import SCHEDULE_COLUMNS
+from calculator.overpayment import Overpayment, OverpaymentData, OverpaymentType, compile_overpayments, \
+    overpayments_to_df
+from calculator.rate_simulation import simulate_loan, simulate_rate_paths
+from calculator.result_job import ResultJob
+from calculator.schedule_engine import iter_amortize_batch, iter_events, schedule_with_checkpoints
+from calculator.sensitivity import sensitivity_grid
+from dashboard.chart_cache import ChartCache, fingerprint
+from dashboard.scenario_registry import ScenarioRegistry
+from dashboard.schedule_table import page_count, schedule_page
+from utils import round_math
 
 test_cases = [
     {
@@ -280,6 +317,76 @@ test_cases = [
             }
         }
     },
+    {
+        'name': 'FULL_TERM, 200.0, 1-300, True, 360 months',
+        'loan_amount': 450000.0,
+        'annual_rate': 0.0758,
+        'loan_term': 360,
+        'overpayments': [Overpayment(overpayment_type=OverpaymentType.FULL_TERM,
+                                     start_month=1,
+                                     end_month=360,
+                                     value=200.0,
+                                     is_constant_payment=True)],
+        'results': {
+            'payment_value': {
+                1: 3171.15,
+                12: 3155.09,
+                60: 3068.49,
+                120: 2909.89,
+                180: 2668.2,
+                240: 2299.85,
+                295: 763.94
+            },
+            'last_month': 295,
+            'overpayment_value': {
+                1: 200.0,
+                12: 216.06,
+                60: 302.66,
+                120: 461.26,
+                180: 702.95,
+                240: 1071.3,
+                295: 0.0
+            }
+        }
+    },
+    {
+        'name': 'ONE_TIME x4, 1000.0, yearly, mixed',
+        'loan_amount': 30000.0,
+        'annual_rate': 0.05,
+        'loan_term': 60,
+        'overpayments': [Overpayment(overpayment_type=OverpaymentType.ONE_TIME,
+                                     start_month=month,
+                                     end_month=month,
+                                     value=1000.0,
+                                     is_constant_payment=month % 24 == 0) for month in (12, 24, 36, 48)],
+        'results': {
+            'payment_value': {
+                1: 566.14,
+                12: 566.14,
+                13: 547.27,
+                24: 547.27,
+                25: 528.39,
+                36: 524.09,
+                37: 504.7,
+                48: 494.97,
+                49: 474.49,
+                50: 473.09
+            },
+            'last_month': 50,
+            'overpayment_value': {
+                1: 0.0,
+                12: 1000.0,
+                13: 0.0,
+                24: 1000.0,
+                25: 18.88,
+                36: 1027.48,
+                37: 42.57,
+                48: 1085.72,
+                49: 74.14,
+                50: 45.7
+            }
+        }
+    },
 ]
 
 
@@ -306,3 +413,661 @@ def test_generate_schedule(case):
     last_month = results['last_month']
     last_month_remaining_balance = schedule.loc[schedule['month'] == last_month, 'remaining_balance'].values[0]
     assert last_month_remaining_balance == 0, f'Remaining balance in last month {last_month} should be zero'
+
+
+def test_schedule_columns_and_dtypes():
+    overpayments = overpayments_to_df([Overpayment(overpayment_type=OverpaymentType.ONE_TIME,
+                                                   start_month=20,
+                                                   value=5000.0,
+                                                   is_constant_payment=True)])
+    schedule = generate_schedule(30000.0, 0.05, 60, 'dtypes', overpayments)
+
+    assert list(schedule.columns) == SCHEDULE_COLUMNS
+    assert schedule['month'].dtype == 'int64'
+    assert schedule['remaining_term'].dtype == 'int64'
+    for column in ['payment', 'interest', 'capital', 'overpayment', 'payment_overpayment', 'remaining_balance']:
+        assert schedule[column].dtype == 'float64', f'Unexpected dtype for {column}'
+
+
+@pytest.mark.parametrize('copies', [1, BATCH_KERNEL_MIN_LANES], ids=['scalar', 'kernel'])
+def test_generate_schedule_batch_matches_generate_schedule(copies):
+    scenarios = [(case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments'])
+                 for case in test_cases] * copies
+    batch = generate_schedule_batch(scenarios)
+
+    assert len(batch) == len(test_cases) * copies
+    for idx, case in enumerate(test_cases):
+        expected = generate_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['name'],
+                                     overpayments_to_df(case['overpayments']))
+        pd.testing.assert_frame_equal(batch.to_df(idx), expected, check_exact=True)
+        assert batch.lengths[idx] == len(expected)
+        assert (batch.month[idx, len(expected):] == 0).all(), f'Padding expected after payoff for {case["name"]}'
+
+
+def test_generate_schedule_batch_parallel_is_deterministic():
+    scenarios = [(case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments'])
+                 for case in test_cases]
+    serial = generate_schedule_batch(scenarios)
+    parallel = generate_schedule_batch(scenarios, max_workers=2, chunk_size=3)
+
+    np.testing.assert_array_equal(parallel.lengths, serial.lengths)
+    for idx in range(len(scenarios)):
+        pd.testing.assert_frame_equal(parallel.to_df(idx), serial.to_df(idx), check_exact=True)
+
+
+def test_cached_schedules_reuse_identical_scenarios():
+    cache = ScheduleCache(maxsize=8)
+    case = test_cases[2]
+    scenario = (case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments'])
+    same_content = (case['loan_amount'], case['annual_rate'], case['loan_term'],
+                    [Overpayment(**asdict(overpayment)) for overpayment in case['overpayments']])
+
+    first = cached_schedules([scenario], cache=cache)[0]
+    second, third = cached_schedules([same_content, scenario], cache=cache)
+
+    assert second is first and third is first
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hits'] == 1
+    expected = generate_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['name'],
+                                 overpayments_to_df(case['overpayments']))
+    pd.testing.assert_frame_equal(first.schedule.to_df(), expected, check_exact=True)
+    assert first.summary.total_loan_cost == summarize_loan(expected).total_loan_cost
+
+
+def test_schedule_with_checkpoints_resumes_after_edit():
+    overpayments = [Overpayment(overpayment_type=OverpaymentType.RANGE,
+                                start_month=10,
+                                end_month=30,
+                                value=300.0,
+                                is_constant_payment=True)]
+    previous = schedule_with_checkpoints(30000.0, 0.05, 60, overpayments, checkpoint_interval=6)
+    edited = overpayments + [Overpayment(overpayment_type=OverpaymentType.ONE_TIME,
+                                         start_month=40,
+                                         value=2000.0,
+                                         is_constant_payment=True)]
+
+    resumed = schedule_with_checkpoints(30000.0, 0.05, 60, edited, checkpoint_interval=6, previous=previous)
+
+    assert resumed.resumed_from == 37
+    expected = generate_schedule(30000.0, 0.05, 60, 'edited', overpayments_to_df(edited))
+    pd.testing.assert_frame_equal(resumed.schedule.to_df(), expected, check_exact=True)
+
+
+def test_cached_schedules_sends_generic_misses_to_the_executor():
+    class RecordingExecutor(ThreadPoolExecutor):
+        def map(self, fn, *iterables, **kwargs):
+            chunks = list(iterables[0])
+            self.scenarios = sum(len(chunk) for chunk in chunks)
+            return super().map(fn, chunks, **kwargs)
+
+    scenarios = [(30000.0, 0.05, 60, [Overpayment(overpayment_type=OverpaymentType.RANGE, start_month=10,
+                                                  end_month=30, value=value, is_constant_payment=True)])
+                 for value in (100.0, 200.0, 300.0)]
+    with RecordingExecutor(max_workers=2) as executor:
+        entries = cached_schedules(scenarios, cache=ScheduleCache(maxsize=8), executor=executor)
+
+    assert executor.scenarios == 3
+    for entry, (principal, annual_rate, months, overpayments) in zip(entries, scenarios):
+        assert entry.run is not None and entry.run.checkpoints
+        expected = generate_schedule(principal, annual_rate, months, '', overpayments_to_df(overpayments))
+        pd.testing.assert_frame_equal(entry.schedule.to_df(), expected, check_exact=True)
+
+
+IMPORT_TIME_BUDGET = 1.0
+
+
+def test_calculator_import_is_headless_and_within_budget():
+    code = ('import sys, time\n'
+            'start = time.perf_counter()\n'
+            'import calculator\n'
+            'elapsed = time.perf_counter() - start\n'
+            'print(elapsed)\n'
+            'print(",".join(name for name in ("streamlit", "dashboard", "pandas", "matplotlib") if name in sys.modules))\n')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split('\n')
+
+    assert output[1] == '', f'calculator imported UI or heavy modules: {output[1]}'
+    assert float(output[0]) < IMPORT_TIME_BUDGET, f'calculator import took {output[0]} s'
+
+
+def test_calculate_result_takes_explicit_inputs():
+    overpayment_data = OverpaymentData(name='Full term',
+                                       overpayments=[Overpayment(overpayment_type=OverpaymentType.FULL_TERM,
+                                                                 start_month=1,
+                                                                 end_month=60,
+                                                                 value=300.0,
+                                                                 is_constant_payment=True)])
+
+    result = calculate_result(loan_data=LoanData(loan_amount=30000.0, loan_annual_rate=0.05, months=60),
+                              overpayments_set=[overpayment_data])
+
+    assert list(result.schedules) == ['No overpayment', 'Full term']
+    assert result.summarises['Full term'].last_month == 38
+
+
+def test_batch_cli_streams_schedules_and_summaries_to_parquet(tmp_path):
+    loan_book = tmp_path / 'loans.csv'
+    pd.DataFrame({
+        'loan_id': [7, 8, 9],
+        'loan_amount': [30000.0, 30000.0, 450000.0],
+        'annual_rate': [0.05, 0.05, 0.0758],
+        'months': [60, 60, 360],
+        'overpayments': ['', json.dumps([{'type': 'ONE_TIME', 'start': 20, 'value': 5000.0,
+                                          'is_constant_payment': True}]), '']
+    }).to_csv(loan_book, index=False)
+
+    loans = run_batch(str(loan_book), schedules_path=str(tmp_path / 'schedules.parquet'),
+                      summaries_path=str(tmp_path / 'summaries.parquet'), chunk_size=2, row_group_size=100)
+
+    assert loans == 3
+    schedules_file = pq.ParquetFile(tmp_path / 'schedules.parquet')
+    assert max(schedules_file.metadata.row_group(i).num_rows
+               for i in range(schedules_file.num_row_groups)) <= 100
+    schedules = schedules_file.read().to_pandas()
+    one_time = schedules[schedules['loan_id'] == 8].drop(columns='loan_id').reset_index(drop=True)
+    expected = generate_schedule(30000.0, 0.05, 60, 'one time', overpayments_to_df(test_cases[2]['overpayments']))
+    pd.testing.assert_frame_equal(one_time, expected, check_exact=True)
+
+    summaries = pq.read_table(tmp_path / 'summaries.parquet').to_pandas()
+    assert summaries['loan_id'].tolist() == [7, 8, 9]
+    assert summaries['last_month'].tolist() == [60, 50, 360]
+    assert summaries['total_loan_cost'][1] == summarize_loan(expected).total_loan_cost
+
+
+def test_batch_runs_open_ended_overpayments_to_term_end_and_applies_rate_changes(tmp_path):
+    loan_book = tmp_path / 'loans.csv'
+    pd.DataFrame({
+        'loan_amount': [450000.0, 450000.0],
+        'annual_rate': [0.0658, 0.0658],
+        'months': [360, 360],
+        'overpayments': [json.dumps([{'type': 'FULL_TERM', 'start': 13, 'value': 500.0}]), ''],
+        'rate_changes': ['', json.dumps({'61': 0.0758, '121': 0.05})]
+    }).to_csv(loan_book, index=False)
+
+    run_batch(str(loan_book), schedules_path=str(tmp_path / 'schedules.parquet'))
+
+    schedules = pd.read_parquet(tmp_path / 'schedules.parquet')
+    full_term = Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=13, end_month=360, value=500.0,
+                            loan_term=360)
+    expected = [generate_schedule(450000.0, 0.0658, 360, '', overpayments_to_df([full_term])),
+                generate_schedule(450000.0, 0.0658, 360, '', overpayments_to_df([]),
+                                  rate_changes={61: 0.0758, 121: 0.05})]
+    for loan_id, schedule in enumerate(expected):
+        actual = schedules[schedules['loan_id'] == loan_id].drop(columns='loan_id').reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, schedule, check_exact=True)
+
+
+@pytest.mark.parametrize('case', test_cases, ids=[case['name'] for case in test_cases])
+def test_iter_schedule_matches_generate_schedule(case):
+    expected = generate_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['name'],
+                                 overpayments_to_df(case['overpayments']))
+
+    rows = list(iter_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments']))
+    chunks = list(iter_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments'],
+                                chunk_size=7))
+
+    pd.testing.assert_frame_equal(pd.DataFrame([asdict(row) for row in rows]), expected, check_exact=True)
+    pd.testing.assert_frame_equal(pd.concat([chunk.to_df() for chunk in chunks], ignore_index=True), expected,
+                                  check_exact=True)
+    assert all(len(chunk) == 7 for chunk in chunks[:-1])
+
+
+def test_iter_schedule_stops_early():
+    df = generate_schedule(450000.0, 0.0758, 360, '', overpayments_to_df([]))
+    rows = iter_schedule(450000.0, 0.0758, 360, [])
+    for row in rows:
+        if row.remaining_balance < 400000.0:
+            break
+    rows.close()
+
+    assert row.month == df['month'][df['remaining_balance'] < 400000.0].iloc[0]
+    assert next(rows, None) is None
+
+
+@pytest.mark.parametrize('case', test_cases, ids=[case['name'] for case in test_cases])
+def test_summarize_schedule_matches_summarize_loan(case):
+    expected = summarize_loan(generate_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'],
+                                                case['name'], overpayments_to_df(case['overpayments'])))
+
+    summary = summarize_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments'])
+
+    assert summary == expected
+
+
+@pytest.mark.parametrize('goal_type, target, is_constant_payment', [
+    (GoalType.PAYOFF_MONTH, 180, False),
+    (GoalType.PAYOFF_MONTH, 180, True),
+    (GoalType.TOTAL_INTEREST, 300000.0, False),
+    (GoalType.MONTHLY_OUTLAY, 4500.0, True),
+])
+def test_solve_overpayment_finds_threshold_to_the_cent(goal_type, target, is_constant_payment):
+    loan_data = LoanData(loan_amount=450000.0, loan_annual_rate=0.0758, months=360)
+
+    result = solve_overpayment(loan_data, goal_type, target, is_constant_payment=is_constant_payment)
+    step = 0.01 if goal_type == GoalType.MONTHLY_OUTLAY else -0.01
+    neighbour = schedule_totals(450000.0, 0.0758, 360,
+                                [goal_overpayment(loan_data, round(result.value + step, 2), is_constant_payment)])
+
+    assert result.is_reachable
+    assert is_goal_met(goal_type, target, schedule_totals(450000.0, 0.0758, 360,
+                                                          [goal_overpayment(loan_data, result.value,
+                                                                            is_constant_payment)]))
+    assert not is_goal_met(goal_type, target, neighbour)
+
+
+def test_solve_overpayment_reports_unreachable_goal():
+    loan_data = LoanData(loan_amount=450000.0, loan_annual_rate=0.0758, months=360)
+
+    result = solve_overpayment(loan_data, GoalType.MONTHLY_OUTLAY, 1000.0)
+
+    assert not result.is_reachable
+    assert result.value == 0.0
+
+
+@pytest.mark.parametrize('is_constant_payment', [False, True])
+def test_sensitivity_grid_matches_summarize_schedule(is_constant_payment):
+    rates = [0.0, 0.035, 0.0758]
+    terms = [60, 240, 360]
+    values = [0.0, 350.0, 2000.0]
+
+    grid = sensitivity_grid(300000.0, rates, terms, values, is_constant_payment=is_constant_payment)
+
+    assert grid.total_loan_cost.shape == (3, 3, 3)
+    for i, rate in enumerate(rates):
+        for j, term in enumerate(terms):
+            for k, value in enumerate(values):
+                overpayments = [goal_overpayment(LoanData(300000.0, rate, term), value, is_constant_payment)] \
+                    if value else []
+                summary = summarize_schedule(300000.0, rate, term, overpayments)
+                assert grid.total_loan_cost[i, j, k] == summary.total_loan_cost
+                assert grid.total_interest[i, j, k] == summary.total_interest
+                assert grid.last_month[i, j, k] == summary.last_month
+    assert grid.to_df('last_month', overpayment_idx=1).loc[0.0758, 240] == grid.last_month[2, 1, 1]
+
+
+@pytest.mark.parametrize('case', test_cases, ids=[case['name'] for case in test_cases])
+def test_simulate_loan_with_flat_rates_matches_summarize_schedule(case):
+    rate_paths = np.full((3, case['loan_term']), case['annual_rate'])
+
+    simulation = simulate_loan(case['loan_amount'], case['loan_term'], rate_paths, case['overpayments'], chunk_size=2)
+    summary = summarize_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['overpayments'])
+
+    assert (simulation.total_interest == summary.total_interest).all()
+    assert (simulation.last_month == summary.last_month).all()
+
+
+@pytest.mark.parametrize('is_constant_payment', [False, True])
+def test_simulate_loan_kernel_matches_generic_loop_on_rate_changes(is_constant_payment):
+    rate_paths = simulate_rate_paths(20, 240, initial_rate=0.0575, margin=0.0183, volatility=0.01, seed=7)
+    overpayments = [Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=13, end_month=240,
+                                value=800.0, is_constant_payment=is_constant_payment, loan_term=240)]
+
+    simulation = simulate_loan(450000.0, 240, rate_paths, overpayments, chunk_size=8)
+
+    assert len(np.unique(rate_paths[0])) > 1
+    for idx, rates in enumerate(rate_paths.tolist()):
+        rows = list(iter_events(450000.0, rates[0], 240, compile_overpayments(overpayments), rates=rates))
+        assert simulation.last_month[idx] == rows[-1][0]
+        assert simulation.total_interest[idx] == round_math(sum(row[2] for row in rows), 2)
+        assert simulation.peak_payment[idx] == max(row[1] for row in rows)
+    assert list(simulation.percentiles(q=(50,)).columns) == ['total_interest', 'last_month', 'peak_payment']
+
+
+@pytest.mark.parametrize('case', test_cases, ids=[case['name'] for case in test_cases])
+def test_rate_changes_match_generic_loop_and_keep_the_prefix(case):
+    rate_changes = {13: case['annual_rate'] + 0.01, 37: case['annual_rate'] - 0.005}
+    rates = LoanData(case['loan_amount'], case['annual_rate'], case['loan_term'], rate_changes).rate_path()
+    fixed = generate_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['name'],
+                              overpayments_to_df(case['overpayments']))
+
+    df = generate_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'], case['name'],
+                           overpayments_to_df(case['overpayments']), rate_changes=rate_changes)
+    rows = list(iter_events(case['loan_amount'], case['annual_rate'], case['loan_term'],
+                            compile_overpayments(case['overpayments']), rates=rates))
+
+    pd.testing.assert_frame_equal(df, pd.DataFrame(rows, columns=SCHEDULE_COLUMNS), check_exact=True)
+    pd.testing.assert_frame_equal(df.iloc[:12], fixed.iloc[:12], check_exact=True)
+    assert summarize_schedule(case['loan_amount'], case['annual_rate'], case['loan_term'],
+                              case['overpayments'], rate_changes=rate_changes) == summarize_loan(df)
+
+
+def test_calculate_result_applies_loan_rate_changes():
+    loan_data = LoanData(loan_amount=450000.0, loan_annual_rate=0.0658, months=360, rate_changes={61: 0.0758})
+
+    result = calculate_result(loan_data, [], no_overpayment_name='No overpayment')
+    schedule = result.schedules['No overpayment']
+
+    assert schedule['payment'][59] < schedule['payment'][60]
+    assert result.summarises['No overpayment'].total_interest > \
+        summarize_schedule(450000.0, 0.0658, 360, []).total_interest
+
+
+@pytest.mark.parametrize('is_constant_payment', [False, True])
+def test_cents_mode_is_exact_and_the_same_in_every_engine(is_constant_payment):
+    rates = LoanData(450000.0, 0.0658, 360, {61: 0.0758, 121: 0.0512}).rate_path()
+    overpayments = [Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=1, end_month=360,
+                                value=1234.56, is_constant_payment=is_constant_payment, loan_term=360)]
+
+    rows = list(iter_schedule(450000.0, 0.0658, 360, overpayments, chunk_size=1000, cents=True,
+                              rate_changes={61: 0.0758, 121: 0.0512}))[0]
+    generic = list(iter_events(450000.0, 0.0658, 360, compile_overpayments(overpayments), rates=rates, cents=True))
+    kernel = [(m, *(column[0] for column in columns)) for m, _lanes, *columns in
+              iter_amortize_batch(np.array([450000.0]), np.array([0.0658]), np.array([360]), np.array([1234.56]),
+                                  np.array([1]), np.array([360]), np.array([is_constant_payment]),
+                                  rate_paths=np.array([rates]), cents=True)]
+
+    assert [row[:7] for row in generic] == kernel
+    pd.testing.assert_frame_equal(rows.to_df(), pd.DataFrame(generic, columns=SCHEDULE_COLUMNS), check_exact=True)
+    assert generic[-1][6] == 0.0
+    assert round(sum(row[3] + row[4] for row in generic) * 100) == 45000000
+
+
+def test_cents_mode_drift_from_float_mode_grows_by_at_most_a_cent_per_month():
+    # Float mode can round a half-cent of interest the other way. The cent stays in the balance, so the modes
+    # drift apart over the term (9 cents by month 234 here), but each month adds at most one cent to the gap
+    # on top of the interest on the gap so far.
+    rng = np.random.default_rng(16)
+    loans = [(243391.97, 0.075, 240, [])]
+    for idx in range(60):
+        months = int(rng.integers(12, 361))
+        overpayments = [] if idx % 3 == 0 else [
+            Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=int(rng.integers(1, months + 1)),
+                        end_month=months, value=round(float(rng.uniform(10.0, 2000.0)), 2),
+                        is_constant_payment=idx % 3 == 2, loan_term=months)]
+        # Quarter-percent rates hit half-cent interest ties most often.
+        amount = round(float(rng.uniform(10000.0, 2000000.0)), 2)
+        loans.append((amount, round(float(rng.uniform(0.01, 0.15)) * 400) / 400, months, overpayments))
+
+    for amount, rate, months, overpayments in loans:
+        df = generate_schedule(amount, rate, months, '', overpayments_to_df(overpayments))
+        cents = generate_schedule(amount, rate, months, '', overpayments_to_df(overpayments), cents=True)
+
+        money = cents[SCHEDULE_COLUMNS[1:7]].to_numpy() * 100
+        np.testing.assert_allclose(money, np.round(money), rtol=0, atol=1e-6)
+        gaps = (cents['remaining_balance'] - df['remaining_balance']).abs().to_numpy()[:min(len(df), len(cents)) - 1]
+        previous = np.concatenate(([0.0], gaps[:-1]))
+        assert (gaps <= previous * (1 + rate / 12) + 0.01 + 1e-6).all()
+
+    df = generate_schedule(243391.97, 0.075, 240, '', overpayments_to_df([]))
+    cents = generate_schedule(243391.97, 0.075, 240, '', overpayments_to_df([]), cents=True)
+    assert round(df['remaining_balance'][233] - cents['remaining_balance'][233], 2) == 0.09
+
+
+def test_benchmark_report_and_baseline_comparison():
+    report = run_benchmarks(collect_benchmarks(quick=True, with_plots=False),
+                            name_filter='generate_schedule/term=12/', repeat=2, min_time=0.001)
+    assert report['results'] and all(name.startswith('generate_schedule/term=12/') for name in report['results'])
+    assert json.loads(json.dumps(report)) == report
+
+    name = next(iter(report['results']))
+    baseline = {'results': {name: {'min': report['results'][name]['min'] / 2}}, 'thresholds': {}}
+    assert compare(report, baseline)[0]['is_regression']
+    assert not compare(report, baseline, thresholds={'generate_schedule/': 1.5})[0]['is_regression']
+
+
+def test_calculate_result_records_spans_per_scenario_and_phase():
+    loan_data = LoanData(loan_amount=300000.0, loan_annual_rate=0.061, months=300)
+    overpayments_set = [OverpaymentData(name='Monthly', overpayments=[
+        Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=1, end_month=300, value=300.0)]),
+        OverpaymentData(name='One-time', overpayments=[
+            Overpayment(overpayment_type=OverpaymentType.ONE_TIME, start_month=24, value=20000.0)])]
+
+    schedule_cache.clear()
+
+    with recording() as recorder, profiling() as profile:
+        calculate_result(loan_data, overpayments_set, no_overpayment_name='Base')
+
+    phases = {(span.phase, span.scenario) for span in recorder.spans}
+    for name in ('Base', 'Monthly', 'One-time'):
+        assert ('summary', name) in phases
+        assert ('frame', name) in phases
+    assert ('engine', 'One-time') in phases
+    assert ('engine', 'Base, Monthly') in phases
+    assert list(recorder.to_df().columns) == ['phase', 'scenario', 'ms', 'details']
+    assert 'calculate_result' in profile.stats()
+
+
+def test_logging_is_off_by_default_and_structured_when_enabled(capsys):
+    import io
+    generate_schedule(30000.0, 0.05, 60, 'Quiet', overpayments_to_df([]))
+    assert capsys.readouterr().out == ''
+
+    stream = io.StringIO()
+    level, handlers = logger.level, list(logger.handlers)
+    try:
+        assert configure_logging('DEBUG', stream=stream)
+        generate_schedule(30000.0, 0.05, 60, 'Loud', overpayments_to_df([]))
+    finally:
+        logger.setLevel(level)
+        logger.handlers[:] = handlers
+    lines = stream.getvalue().splitlines()
+    assert any("schedule_start scenario='Loud' months=60" in line for line in lines)
+    assert any("span phase='engine' scenario='Loud'" in line for line in lines)
+
+
+def test_chart_cache_evicts_least_recently_used_beyond_its_size():
+    cache = ChartCache(max_bytes=10)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+    cache.put('c', b'cccc')
+    cache.put('huge', b'x' * 11)
+
+    assert 'b' not in cache and 'huge' not in cache
+    assert cache.get('a') == b'aaaa' and cache.get('c') == b'cccc'
+    assert cache.stats()['bytes'] == 8
+
+
+def test_chart_fingerprint_covers_data_and_language():
+    balance = np.array([300.0, 200.0, 100.0])
+    key = fingerprint('remaining_balance', 'en', 'No overpayment', balance)
+
+    assert key == fingerprint('remaining_balance', 'en', 'No overpayment', balance.copy())
+    assert key != fingerprint('remaining_balance', 'pl', 'No overpayment', balance)
+    assert key != fingerprint('remaining_balance', 'en', 'No overpayment', balance.astype(np.float32))
+    assert key != fingerprint('remaining_balance', 'en', 'No overpayment', np.array([300.0, 200.0, 100.01]))
+
+
+def test_schedule_page_windows_rows_and_columns():
+    schedule = generate_schedule(30000.0, 0.05, 60, '', overpayments_to_df([]))
+
+    page = schedule_page(schedule, page=3, page_size=24, columns=['remaining_balance', 'payment'])
+
+    assert page_count(len(schedule), 24) == 3
+    assert list(page.columns) == ['month', 'payment', 'remaining_balance']
+    assert list(page['month']) == list(range(49, 61))
+    assert list(schedule_page(schedule, page=9, page_size=24)['month']) == list(range(49, 61))
+    assert list(schedule_page(schedule, page=1, page_size=12).columns) == SCHEDULE_COLUMNS
+
+
+def test_scenario_registry_replaces_and_deduplicates_by_id_and_content():
+    loan_data = LoanData(loan_amount=300000.0, loan_annual_rate=0.07, months=360)
+    monthly = OverpaymentData(name='Monthly', overpayments=[
+        Overpayment(overpayment_type=OverpaymentType.FULL_TERM, start_month=1, value=500.0)])
+    one_time = OverpaymentData(name='One-time', overpayments=[
+        Overpayment(overpayment_type=OverpaymentType.ONE_TIME, start_month=12, value=20000.0)])
+    registry = ScenarioRegistry()
+
+    assert registry.register('prepayment/monthly', monthly)
+    key = registry.fingerprint(loan_data, 'No overpayment')
+    assert registry.sync('custom', [monthly, one_time])
+    for _ in range(3):
+        assert not registry.register('prepayment/monthly', monthly)
+        assert not registry.sync('custom', [monthly, one_time])
+    assert [data.name for data in registry.overpayments_set()] == ['Monthly', 'One-time']
+    assert len(registry) == 3
+
+    registry.sync('custom', [one_time])
+    assert 'custom/Monthly' not in registry
+    assert registry.fingerprint(loan_data, 'No overpayment') != key
+    registry.sync('custom', [])
+    assert registry.fingerprint(loan_data, 'No overpayment') == key
+
+    monthly = monthly.add_overpayment(Overpayment(overpayment_type=OverpaymentType.ONE_TIME, start_month=24,
+                                                  value=1000.0))
+    assert registry.register('prepayment/monthly', monthly)
+    assert registry.fingerprint(loan_data, 'No overpayment') != key
+
+    # The same name with different content is kept under the prefix of its id, so editing it changes the result.
+    edited = key = registry.fingerprint(loan_data, 'No overpayment')
+    registry.sync('custom', [one_time, OverpaymentData(name='Monthly', overpayments=one_time.overpayments)])
+    assert [data.name for data in registry.overpayments_set()] == ['Monthly', 'One-time', 'Monthly (custom)']
+    assert registry.overpayments_set()[2].overpayments == one_time.overpayments
+    assert registry.fingerprint(loan_data, 'No overpayment') != edited
+    assert [data.name for data in registry.overpayments_set(reserved=('One-time',))] == \
+        ['Monthly', 'One-time (custom)', 'Monthly (custom)']
+
+
+def test_value_types_are_immutable_hashable_and_picklable():
+    rate_changes = {61: 0.0758}
+    loan_data = LoanData(loan_amount=450000.0, loan_annual_rate=0.0658, months=360, rate_changes=rate_changes)
+    rate_changes[121] = 0.05
+    one_time = Overpayment(overpayment_type=OverpaymentType.ONE_TIME, start_month=12, end_month=30, value=20000.0)
+    overpayment_data = OverpaymentData(name='One-time', overpayments=[one_time])
+
+    assert dict(loan_data.rate_changes) == {61: 0.0758}
+    assert one_time.end_month == 12
+    for value in (loan_data, one_time, overpayment_data, summarize_schedule(30000.0, 0.05, 60, [one_time])):
+        assert not hasattr(value, '__dict__')
+        assert pickle.loads(pickle.dumps(value)) == value
+        assert hash(pickle.loads(pickle.dumps(value))) == hash(value)
+    with pytest.raises(FrozenInstanceError):
+        one_time.value = 1.0
+    with pytest.raises(TypeError):
+        loan_data.rate_changes[121] = 0.05
+
+    extended = overpayment_data.add_overpayment(one_time)
+    assert overpayment_data.overpayments == (one_time,)
+    assert extended.canonical() == ('One-time', (one_time.canonical(), one_time.canonical()))
+    assert extended.remove_overpayment(0) == overpayment_data
+    assert len({overpayment_data, OverpaymentData(name='One-time', overpayments=[one_time]), extended}) == 2
+
+
+@pytest.mark.parametrize('export_format', EXPORT_FORMATS)
+def test_export_result_round_trips_schedules_and_summaries(export_format):
+    overpayment_data = OverpaymentData(name='Full term', overpayments=[test_cases[3]['overpayments'][0]])
+    result = calculate_result(loan_data=LoanData(loan_amount=30000.0, loan_annual_rate=0.05, months=60),
+                              overpayments_set=[overpayment_data])
+
+    schedules, summaries = read_export(export_result(result, export_format), export_format)
+
+    assert summaries['scenario'].tolist() == ['No overpayment', 'Full term']
+    assert summaries['last_month'].tolist() == [summary.last_month for summary in result.summarises.values()]
+    assert summaries['total_loan_cost'][1] == result.summarises['Full term'].total_loan_cost
+    for name, expected in result.schedules.items():
+        schedule = schedules[schedules['scenario'] == name].drop(columns='scenario').reset_index(drop=True)
+        pd.testing.assert_frame_equal(schedule, expected, check_exact=True)
+
+
+def test_batch_writes_arrow_streams(tmp_path):
+    loan_book = tmp_path / 'loans.csv'
+    pd.DataFrame({'loan_amount': [30000.0, 450000.0], 'annual_rate': [0.05, 0.0758], 'months': [60, 360]}) \
+        .to_csv(loan_book, index=False)
+
+    run_batch(str(loan_book), schedules_path=str(tmp_path / 'schedules.arrows'),
+              summaries_path=str(tmp_path / 'summaries.arrows'), export_format='arrow')
+
+    schedules = pa.ipc.open_stream((tmp_path / 'schedules.arrows').read_bytes()).read_pandas()
+    summaries = pa.ipc.open_stream((tmp_path / 'summaries.arrows').read_bytes()).read_pandas()
+    assert len(schedules) == 420
+    assert summaries['last_month'].tolist() == [60, 360]
+
+
+def test_api_serves_schedules_summaries_and_comparisons():
+    pool = make_pool(workers=2, threads=True)
+    loan = {'loan_amount': 30000.0, 'loan_annual_rate': 0.05, 'months': 60}
+    one_time = [{'type': 'ONE_TIME', 'start': 20, 'value': 5000.0, 'is_constant_payment': True}]
+
+    async def exchange() -> dict:
+        sock, port = bind_unused_port()
+        server = HTTPServer(make_app(pool), max_body_size=4096)
+        server.add_sockets([sock])
+        client = AsyncHTTPClient()
+
+        async def post(path: str, payload) -> tuple[int, Optional[dict]]:
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            response = await client.fetch(f'http://127.0.0.1:{port}{path}', method='POST', body=body,
+                                          raise_error=False)
+            return response.code, json.loads(response.body) if response.body else None
+
+        responses = {
+            'schedule': await post('/schedule', {'loan_data': loan, 'overpayments': one_time}),
+            'summary': await post('/summary', {'loan_data': loan, 'overpayments': one_time}),
+            'compare': await post('/compare', {'loan_data': loan,
+                                               'overpayments_set': [{'name': 'One-time', 'overpayments': one_time}]}),
+            'missing': await post('/summary', {'loan_data': {'loan_amount': 30000.0}}),
+            'outside_term': await post('/summary', {'loan_data': {**loan, 'rate_changes': {'61': 0.06}}}),
+            'too_large': await post('/summary', b'{"loan_data": "' + b'x' * 8192 + b'"}'),
+            'huge_amount': await post('/schedule', {'loan_data': {**loan, 'loan_amount': 1e308}}),
+            'negative_rate': await post('/summary', {'loan_data': {**loan, 'loan_annual_rate': -5}}),
+            'nan_rate_change': await post('/summary', b'{"loan_data": {"loan_amount": 30000, "loan_annual_rate": '
+                                                      b'0.05, "months": 60, "rate_changes": {"12": NaN}}}'),
+            'infinite_months': await post('/summary', b'{"loan_data": {"loan_amount": 30000, "loan_annual_rate": '
+                                                      b'0.05, "months": Infinity}}'),
+            'infinite_overpayment': await post('/summary', b'{"loan_data": {"loan_amount": 30000, '
+                                                           b'"loan_annual_rate": 0.05, "months": 60}, "overpayments": '
+                                                           b'[{"type": "ONE_TIME", "start": 12, "value": Infinity}]}'),
+        }
+        pool.max_pending = 0
+        responses['busy'] = await post('/summary', {'loan_data': loan})
+        server.stop()
+        client.close()
+        return responses
+
+    responses = asyncio.run(exchange())
+    pool.shutdown()
+
+    expected = generate_schedule(30000.0, 0.05, 60, 'one time', overpayments_to_df(test_cases[2]['overpayments']))
+    code, schedule = responses['schedule']
+    assert code == 200
+    pd.testing.assert_frame_equal(pd.DataFrame(schedule['schedule']), expected, check_exact=True)
+    assert schedule['summary'] == responses['summary'][1]['summary']
+    assert schedule['summary']['total_loan_cost'] == summarize_loan(expected).total_loan_cost
+    comparison = responses['compare'][1]['scenarios']
+    assert [scenario['name'] for scenario in comparison] == ['No overpayment', 'One-time']
+    assert comparison[1]['months_saved'] == 60 - schedule['summary']['last_month']
+    assert responses['missing'] == (400, {'error': 'loan_data.loan_annual_rate is required'})
+    assert responses['outside_term'] == (400, {'error': 'Rate change month 61 is outside the loan term 1-60'})
+    assert responses['too_large'][0] == 400
+    assert responses['huge_amount'] == (400, {'error': 'loan_data.loan_amount must be positive and at most 1e+12'})
+    assert responses['negative_rate'] == (400, {'error': 'loan_data.loan_annual_rate must be between 0 and 1'})
+    assert responses['nan_rate_change'] == (400, {'error': 'loan_data.rate_changes.12 must be between 0 and 1'})
+    assert responses['infinite_months'][0] == 400
+    assert responses['infinite_overpayment'] == (400, {'error': 'Overpayment value must be between 0 and 1e+12'})
+    assert responses['busy'][0] == 503
+
+
+def test_result_job_reports_progress_and_matches_calculate_result():
+    loan_data = LoanData(loan_amount=450000.0, loan_annual_rate=0.0658, months=360, rate_changes={61: 0.0758})
+    overpayments_set = [OverpaymentData(name=f'One-time {value}', overpayments=[
+        Overpayment(overpayment_type=OverpaymentType.ONE_TIME, start_month=12, value=value)])
+        for value in (10000.0, 20000.0, 30000.0)]
+    schedule_cache.clear()
+    gate = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Holds the only worker, so the job cannot progress until the gate opens.
+        executor.submit(gate.wait)
+        job = ResultJob(loan_data, overpayments_set, executor, chunk_size=2)
+        assert not job.wait(0.01)
+        assert len(job.futures) == 2 and job.progress() == (0, 4)
+        assert job.partial_result().summarises == {}
+        gate.set()
+        # Progress moves by whole chunks.
+        job.futures[0].result()
+        assert job.progress() in ((2, 4), (4, 4))
+        with recording() as recorder:
+            result = job.result()
+
+    assert job.finished and job.progress() == (4, 4)
+    expected = calculate_result(loan_data=loan_data, overpayments_set=overpayments_set)
+    assert list(result.schedules) == list(expected.schedules)
+    assert result.summarises == expected.summarises
+    for name, schedule in expected.schedules.items():
+        pd.testing.assert_frame_equal(result.schedules[name], schedule, check_exact=True)
+    assert job.partial_result().schedules['No overpayment'] is result.schedules['No overpayment']
+    # The spans of the worker threads reach the recorder active when the result is read.
+    assert {(span.phase, span.scenario) for span in recorder.spans} == \
+        {(phase, name) for phase in ('engine', 'summary', 'frame') for name in result.summarises}
+
+    with pytest.raises(ValueError, match='Scenario names must be unique'):
+        ResultJob(loan_data, overpayments_set + overpayments_set[:1], executor)
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 OVERPAYMENT_TYPE = 'type'
 OVERPAYMENT_START = 'start'
@@ -14,3 +15,34 @@ language_labels = {
 def round_math(n, decimals=0):
     multiplier = 10 ** decimals
     return math.floor(n * multiplier + 0.5) / multiplier
+
+
+def round_math_array(a, decimals=0):
+    multiplier = 10 ** decimals
+    return np.floor(np.asarray(a, dtype=np.float64) * multiplier + 0.5) / multiplier
+
+
+def round_cents(n):
+    # round_math(n, 2) for the month loops, without computing the multiplier on every call.
+    return math.floor(n * 100 + 0.5) / 100
+
+
+def round_cents_array(a) -> np.ndarray:
+    return np.floor(np.asarray(a, dtype=np.float64) * 100 + 0.5) / 100
+
+
+def round_half_up(n) -> int:
+    # Half-up rounding to a whole number, for amounts already held in cents.
+    return math.floor(n + 0.5)
+
+
+def round_half_up_array(a) -> np.ndarray:
+    return np.floor(np.asarray(a, dtype=np.float64) + 0.5).astype(np.int64)
+
+
+def to_cents(amount) -> int:
+    return round_half_up(amount * 100)
+
+
+def to_cents_array(a) -> np.ndarray:
+    return round_half_up_array(np.asarray(a, dtype=np.float64) * 100)